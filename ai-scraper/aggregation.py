@@ -0,0 +1,203 @@
+"""
+Server-side ranking aggregation.
+
+Keeps animal_rating_summary (see sql/rating_summary.sql) in step with the ratings table: per-animal
+counts, per-category sums and means, and the overall average. Triggers stamp every inserted or
+edited rating with updated_at and record every deleted one in rating_deletions. Each run pages
+through the changes since the stored watermark, recomputes the animals they touch from all of
+their ratings in id-keyset pages, and writes the results together with the new watermark in one RPC.
+
+--full rebuilds every summary from all ratings; the workflow runs it weekly as a safety net.
+
+Usage:
+    python ai-scraper/aggregation.py [--full] [--page-size N]
+"""
+import argparse
+from datetime import datetime, timedelta
+from db_service import get_supabase
+from instrumentation import span
+
+# Columns of the ratings table, in the order the rankings page lists them
+RATING_CATEGORIES = [
+    "color",
+    "relative_strength",
+    "curiosity",
+    "history",
+    "survival_mechanism",
+    "shape",
+    "intelligence",
+    "relative_speed",
+    "world_attitude",
+    "overall_coolness",
+]
+
+SUMMARY_TABLE = "animal_rating_summary"
+STATE_TABLE = "rating_aggregation_state"
+DELETIONS_TABLE = "rating_deletions"
+RATING_COLUMNS = ", ".join(["id", "animal_id", "created_at", *RATING_CATEGORIES])
+CHANGE_OVERLAP = timedelta(minutes=10)  # how far before the watermark each run looks again
+PAGE_SIZE = 1000  # PostgREST's default max rows per request
+LOOKUP_BATCH = 100  # ids per in_() filter, keeps the request URL short
+
+class AnimalAggregate:
+    """Running rating count and per-category sums of one animal."""
+
+    def __init__(self, count=0, sums=None, last_rating_at=None):
+        self.count = count
+        self.sums = {category: 0.0 for category in RATING_CATEGORIES}
+        self.sums.update(sums or {})
+        self.last_rating_at = last_rating_at
+
+    def add(self, rating):
+        self.count += 1
+        for category in RATING_CATEGORIES:
+            # Missing scores count as 0, as they always have on the rankings page
+            self.sums[category] += float(rating.get(category) or 0)
+        self.last_rating_at = max(filter(None, [self.last_rating_at, rating.get("created_at")]), default=None)
+
+    def averages(self):
+        return {category: self.sums[category] / self.count if self.count else 0.0 for category in RATING_CATEGORIES}
+
+    def average(self):
+        """Mean of the category means."""
+        averages = self.averages()
+        return sum(averages.values()) / len(averages)
+
+    def to_row(self, animal_id):
+        return {
+            "animal_id": animal_id,
+            "rating_count": self.count,
+            "category_sums": self.sums,
+            "category_averages": self.averages(),
+            "average": self.average(),
+            "last_rating_at": self.last_rating_at,
+        }
+
+def read_watermark(client):
+    """updated_at / deleted_at of the newest change already in the summaries, or None."""
+    response = client.table(STATE_TABLE).select("last_changed_at").execute()
+    return response.data[0].get("last_changed_at") if response.data else None
+
+def iter_pages(client, table, columns, order_column="id", since=None, animal_ids=None, page_size=PAGE_SIZE):
+    """
+    Yields pages of `table` rows ordered by (order_column, id), optionally only those with
+    order_column >= `since` or belonging to `animal_ids`. Keyset paging keeps every page an
+    index range scan, however deep into the table it is.
+    """
+    after = None
+    while True:
+        query = client.table(table).select(columns)
+        if animal_ids is not None:
+            query = query.in_("animal_id", animal_ids)
+        if after is not None and order_column == "id":
+            query = query.gt("id", after[1])
+        elif after is not None:
+            query = query.or_(
+                f'{order_column}.gt."{after[0]}",and({order_column}.eq."{after[0]}",id.gt.{after[1]})'
+            )
+        elif since is not None:
+            query = query.gte(order_column, since)
+        if order_column != "id":
+            query = query.order(order_column)
+        with span("ratings_page", table=table, page_size=page_size) as current:
+            rows = query.order("id").limit(page_size).execute().data or []
+            current.set(rows=len(rows))
+        if rows:
+            yield rows
+        if len(rows) < page_size:
+            return
+        after = (rows[-1][order_column], rows[-1]["id"])
+
+def latest_change(client):
+    """The newest updated_at or deleted_at so far, as a datetime, or None when there are no ratings."""
+    latest = []
+    for table, column in (("ratings", "updated_at"), (DELETIONS_TABLE, "deleted_at")):
+        rows = client.table(table).select(column).order(column, desc=True).limit(1).execute().data
+        latest.extend(datetime.fromisoformat(row[column]) for row in rows or [])
+    return max(latest, default=None)
+
+def aggregate_ratings(pages):
+    """Folds pages of ratings into {animal_id: AnimalAggregate}. Returns (aggregates, ratings read)."""
+    aggregates = {}
+    processed = 0
+    for rows in pages:
+        for rating in rows:
+            aggregates.setdefault(rating["animal_id"], AnimalAggregate()).add(rating)
+        processed += len(rows)
+        print(f"Aggregated {processed} ratings")
+    return aggregates, processed
+
+def changed_animals(client, since, page_size=PAGE_SIZE):
+    """Animals with a rating inserted, edited or deleted at or after `since`."""
+    animal_ids = set()
+    for table, column in (("ratings", "updated_at"), (DELETIONS_TABLE, "deleted_at")):
+        for rows in iter_pages(client, table, f"id, animal_id, {column}", column, since, page_size=page_size):
+            animal_ids.update(row["animal_id"] for row in rows)
+    return animal_ids
+
+def recompute(client, animal_ids, page_size=PAGE_SIZE):
+    """Aggregates of the given animals from all of their ratings. Animals without ratings are left out."""
+    animal_ids = sorted(animal_ids)
+    aggregates = {}
+    processed = 0
+    for start in range(0, len(animal_ids), LOOKUP_BATCH):
+        batch = animal_ids[start:start + LOOKUP_BATCH]
+        batch_aggregates, batch_processed = aggregate_ratings(
+            iter_pages(client, "ratings", RATING_COLUMNS, animal_ids=batch, page_size=page_size)
+        )
+        aggregates.update(batch_aggregates)
+        processed += batch_processed
+    return aggregates, processed
+
+def run_aggregation(full=False, client=None, page_size=PAGE_SIZE):
+    """
+    Brings animal_rating_summary up to date and returns the number of animals updated.
+    Incremental by default: every animal with a rating inserted, edited or deleted since the
+    watermark (minus CHANGE_OVERLAP) is recomputed from all of its ratings. With `full`, every
+    summary is rebuilt from all ratings.
+    """
+    client = client or get_supabase()
+    previous = read_watermark(client)
+    full = full or previous is None
+    # The watermark is the newest change before reading anything: whatever changes while the run
+    # reads is newer, so the next run picks it up
+    changed_at = latest_change(client)
+    removed = []
+
+    with span("aggregate_ratings", full=full) as current:
+        if full:
+            print("Aggregating all ratings")
+            aggregates, processed = aggregate_ratings(iter_pages(client, "ratings", RATING_COLUMNS, page_size=page_size))
+        else:
+            # Changes are stamped when their transaction starts but become visible when it commits,
+            # so the window reaches back past the watermark; recomputing an animal twice is harmless
+            since = (datetime.fromisoformat(previous) - CHANGE_OVERLAP).isoformat()
+            print(f"Aggregating ratings changed since {since}")
+            touched = changed_animals(client, since, page_size)
+            aggregates, processed = recompute(client, touched, page_size)
+            removed = sorted(touched - aggregates.keys())
+        current.set(ratings=processed, animals=len(aggregates) + len(removed))
+    if not full and not aggregates and not removed:
+        print("No rating changes since the last run")
+        return 0
+
+    rows = [aggregate.to_row(animal_id) for animal_id, aggregate in aggregates.items()]
+    with span("rpc", function="apply_rating_summary", animals=len(rows) + len(removed)):
+        client.rpc("apply_rating_summary", {
+            "p_rows": rows,
+            "p_removed": removed,
+            "p_previous_changed_at": previous,
+            "p_changed_at": changed_at.isoformat() if changed_at else None,
+            "p_reset": full,
+        }).execute()
+    print(f"Updated {len(rows)} and removed {len(removed)} animal summaries from {processed} ratings")
+    return len(rows) + len(removed)
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Precompute per-animal rating summaries for the rankings page.")
+    parser.add_argument("--full", action="store_true",
+                        help="rebuild every summary from all ratings")
+    parser.add_argument("--page-size", type=int, default=PAGE_SIZE,
+                        help="ratings per request (default: %(default)s)")
+    args = parser.parse_args()
+    run_aggregation(args.full, page_size=args.page_size)
@@ -1,9 +1,27 @@
 class Animal:
-    def __init__(self, name, article):
+    def __init__(self, name, article, wiki_title=None, wiki_page_id=None, wiki_revision_id=None):
         self.name = name
         self.article = article
+        self.wiki_title = wiki_title
+        # The Wikipedia revision the article was generated from, so a refresh can tell if it changed
+        self.wiki_page_id = wiki_page_id
+        self.wiki_revision_id = wiki_revision_id
         self.translations = []
 
+    def to_dict(self):
+        return {
+            "name": self.name,
+            "article": self.article,
+            "wiki_title": self.wiki_title,
+            "wiki_page_id": self.wiki_page_id,
+            "wiki_revision_id": self.wiki_revision_id,
+        }
+
+    @classmethod
+    def from_dict(cls, data):
+        return cls(data["name"], data["article"], data.get("wiki_title"),
+                   data.get("wiki_page_id"), data.get("wiki_revision_id"))
+
     def __str__(self):
         return f"{self.name}\n\n{self.article}"
 
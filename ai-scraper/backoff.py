@@ -0,0 +1,74 @@
+import random
+import re
+import time
+from instrumentation import add_to_current
+
+MAX_ATTEMPTS = 5
+BASE_DELAY = 2  # seconds
+MAX_DELAY = 60  # seconds
+
+# google.api_core errors embed the RetryInfo detail as "retry_delay { seconds: N }"
+_RETRY_DELAY_PATTERNS = [
+    re.compile(r"retry_delay\s*\{\s*seconds:\s*(\d+)"),
+    re.compile(r"retry in ([\d.]+)\s*s", re.IGNORECASE),
+]
+
+def retry_after_hint(error):
+    """Returns the server-suggested delay in seconds carried by a rate-limit error, or None."""
+    response = getattr(error, "response", None)
+    headers = getattr(response, "headers", None) or {}
+    retry_after = headers.get("Retry-After")
+    if retry_after:
+        try:
+            return float(retry_after)
+        except ValueError:
+            pass
+
+    message = str(error)
+    for pattern in _RETRY_DELAY_PATTERNS:
+        match = pattern.search(message)
+        if match:
+            return float(match.group(1))
+    return None
+
+def is_rate_limit(error):
+    """True for quota errors: HTTP 429 responses and google.api_core's ResourceExhausted."""
+    status = getattr(getattr(error, "response", None), "status_code", None) or getattr(error, "code", None)
+    return status == 429 or type(error).__name__ == "ResourceExhausted"
+
+def backoff_delay(attempt, base=BASE_DELAY, cap=MAX_DELAY):
+    """Exponential backoff with full jitter."""
+    return random.uniform(0, min(cap, base * 2 ** attempt))
+
+def call_with_backoff(func, max_attempts=MAX_ATTEMPTS, base=BASE_DELAY, cap=MAX_DELAY, description="Request"):
+    """
+    Calls `func` until it succeeds, sleeping between attempts.
+    Rate-limit hints from the server take precedence over the exponential schedule.
+    """
+    for attempt in range(max_attempts):
+        try:
+            return func()
+        except Exception as e:
+            if attempt == max_attempts - 1:
+                raise
+            hint = retry_after_hint(e)
+            delay = hint + random.uniform(0, base) if hint is not None else backoff_delay(attempt, base, cap)
+            print(f"{description} failed (attempt {attempt + 1}/{max_attempts}): {e}. Retrying in {delay:.1f} seconds...")
+            add_to_current("retries")
+            time.sleep(delay)
+
+async def async_call_with_backoff(func, max_attempts=MAX_ATTEMPTS, base=BASE_DELAY, cap=MAX_DELAY, description="Request"):
+    """Like call_with_backoff, for a coroutine function `func`; waits without blocking the event loop."""
+    import asyncio
+
+    for attempt in range(max_attempts):
+        try:
+            return await func()
+        except Exception as e:
+            if attempt == max_attempts - 1:
+                raise
+            hint = retry_after_hint(e)
+            delay = hint + random.uniform(0, base) if hint is not None else backoff_delay(attempt, base, cap)
+            print(f"{description} failed (attempt {attempt + 1}/{max_attempts}): {e}. Retrying in {delay:.1f} seconds...")
+            add_to_current("retries")
+            await asyncio.sleep(delay)
@@ -0,0 +1,99 @@
+"""
+Benchmark for compress_image: compares the current strategy (downscale, then search
+quality downwards from the top) against the previous full-resolution loop that stepped quality down by 10.
+
+Usage:
+    python ai-scraper/bench_compress.py [IMAGE_DIR]
+
+Without IMAGE_DIR a synthetic corpus of photo-sized JPEGs is generated.
+"""
+import argparse
+import io
+import os
+import random
+import time
+from PIL import Image, ImageDraw
+from fetch_animal_images import TARGET_SIZE, compress_image_with_stats
+
+SYNTHETIC_SIZES = [(6000, 4000), (4000, 3000), (2400, 1600), (1200, 800), (640, 480)]
+
+def legacy_compress_image(image_data, max_size=TARGET_SIZE):
+    """The previous compress_image loop, kept as the baseline. Returns (bytes, encodes)."""
+    img = Image.open(io.BytesIO(image_data))
+    if img.mode in ('RGBA', 'LA'):
+        background = Image.new('RGB', img.size, (255, 255, 255))
+        background.paste(img, mask=img.split()[-1])
+        img = background
+
+    encodes = 0
+    quality = 80
+    while quality > 5:
+        buffer = io.BytesIO()
+        img.save(buffer, format="WEBP", quality=quality)
+        encodes += 1
+        if buffer.tell() <= max_size:
+            return buffer.getvalue(), encodes
+        quality -= 10
+
+    buffer = io.BytesIO()
+    img.save(buffer, format="WEBP", quality=5)
+    return buffer.getvalue(), encodes + 1
+
+def synthetic_image(width, height, seed=0):
+    """A photo-like JPEG: a gradient with overlapping shapes and sensor-style noise."""
+    rng = random.Random(seed)
+    img = Image.linear_gradient("L").resize((width, height)).convert("RGB")
+    draw = ImageDraw.Draw(img)
+    for _ in range(40):
+        x, y = rng.randrange(width), rng.randrange(height)
+        radius = rng.randrange(min(width, height) // 20, min(width, height) // 3)
+        color = tuple(rng.randrange(256) for _ in range(3))
+        draw.ellipse((x - radius, y - radius, x + radius, y + radius), fill=color)
+    noise = Image.effect_noise((width, height), 48).convert("RGB")
+    img = Image.blend(img, noise, 0.2)
+
+    buffer = io.BytesIO()
+    img.save(buffer, format="JPEG", quality=92)
+    return buffer.getvalue()
+
+def load_corpus(image_dir=None):
+    """Returns a list of (name, image bytes)."""
+    if image_dir is None:
+        return [
+            (f"synthetic_{width}x{height}", synthetic_image(width, height, seed))
+            for seed, (width, height) in enumerate(SYNTHETIC_SIZES)
+        ]
+    corpus = []
+    for filename in sorted(os.listdir(image_dir)):
+        with open(os.path.join(image_dir, filename), "rb") as f:
+            corpus.append((filename, f.read()))
+    return corpus
+
+def measure(compress, image_data):
+    start = time.perf_counter()
+    data, encodes = compress(image_data)
+    return time.perf_counter() - start, encodes, len(data)
+
+def main(image_dir=None):
+    corpus = load_corpus(image_dir)
+    totals = {"legacy": [0.0, 0, 0], "current": [0.0, 0, 0]}
+
+    print(f"{'image':<28} {'strategy':<8} {'encodes':>7} {'time (s)':>9} {'size (KB)':>10}")
+    for name, image_data in corpus:
+        for strategy, compress in (("legacy", legacy_compress_image), ("current", compress_image_with_stats)):
+            elapsed, encodes, size = measure(compress, image_data)
+            totals[strategy][0] += elapsed
+            totals[strategy][1] += encodes
+            totals[strategy][2] += size
+            print(f"{name[:28]:<28} {strategy:<8} {encodes:>7} {elapsed:>9.2f} {size / 1024:>10.1f}")
+
+    print()
+    for strategy, (elapsed, encodes, size) in totals.items():
+        print(f"{strategy:<8} total: {encodes} encodes, {elapsed:.2f}s, {size / 1024:.1f}KB")
+    if totals["current"][0]:
+        print(f"Speedup: {totals['legacy'][0] / totals['current'][0]:.1f}x")
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark compress_image against the previous quality loop.")
+    parser.add_argument("image_dir", nargs="?", help="directory of sample images (default: synthetic corpus)")
+    main(parser.parse_args().image_dir)
@@ -0,0 +1,73 @@
+"""
+Import-time benchmark for the scraper modules.
+
+Each module is imported in a fresh interpreter without credentials. The script fails when an
+import takes longer than its budget or pulls in one of the heavy SDKs that are only meant to
+load on first use.
+
+Usage:
+    python ai-scraper/bench_imports.py [--repeat N]
+"""
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+
+SCRAPER_DIR = os.path.dirname(os.path.abspath(__file__))
+
+# Milliseconds, median over the repeats
+IMPORT_BUDGETS_MS = {
+    "animal": 20,
+    "cache": 50,
+    "backoff": 50,
+    "fetch_wiki_page": 100,
+    "gemini": 100,
+    "random_animal": 100,
+    "translation": 100,
+    "db_service": 150,
+}
+
+# SDKs that must stay unimported until a client is actually needed
+DEFERRED_MODULES = ["supabase", "google.generativeai", "serpapi", "httpx", "requests"]
+
+PROBE = """
+import json, sys, time
+start = time.perf_counter()
+import {module}
+elapsed = (time.perf_counter() - start) * 1000
+print(json.dumps({{"ms": elapsed, "loaded": [name for name in {deferred!r} if name in sys.modules]}}))
+"""
+
+def measure(module):
+    env = {key: value for key, value in os.environ.items()
+           if key not in ("GEMINI_API_KEY", "SUPABASE_URL", "SUPABASE_KEY", "SERAPI_KEY")}
+    result = subprocess.run(
+        [sys.executable, "-c", PROBE.format(module=module, deferred=DEFERRED_MODULES)],
+        cwd=SCRAPER_DIR, env=env, capture_output=True, text=True, check=True,
+    )
+    return json.loads(result.stdout.strip().splitlines()[-1])
+
+def main(repeat=5):
+    failures = []
+    print(f"{'module':<18} {'median (ms)':>12} {'budget (ms)':>12}  deferred SDKs loaded")
+    for module, budget in IMPORT_BUDGETS_MS.items():
+        runs = [measure(module) for _ in range(repeat)]
+        median = statistics.median(run["ms"] for run in runs)
+        loaded = runs[0]["loaded"]
+        print(f"{module:<18} {median:>12.1f} {budget:>12}  {', '.join(loaded) or '-'}")
+        if median > budget:
+            failures.append(f"{module} took {median:.1f}ms (budget {budget}ms)")
+        if loaded:
+            failures.append(f"{module} imported {', '.join(loaded)} at import time")
+
+    if failures:
+        print("\n" + "\n".join(failures))
+        sys.exit(1)
+    print("\nAll imports within budget.")
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Check that importing the scraper modules stays cheap.")
+    parser.add_argument("--repeat", type=int, default=5, help="imports per module (default: %(default)s)")
+    main(parser.parse_args().repeat)
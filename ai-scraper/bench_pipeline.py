@@ -0,0 +1,482 @@
+"""
+Offline benchmark for the ingestion pipeline.
+
+Runs index.main() (one animal per call) or index.batch_main() against in-process stand-ins for
+Wikipedia, Gemini, SerpAPI, the image hosts and Supabase, so throughput changes can be measured
+without credentials or network access. Each fake has a configurable latency, error rate and
+payload size. All local state (catalog, checkpoints, image index, images) goes to a temporary
+directory and the response cache is disabled, so every run pays for every call.
+
+Reports end-to-end and per-stage latency percentiles, per-call percentiles for every instrumented
+span, and animals/minute. With --compress it benchmarks compress_image on a synthetic corpus instead.
+
+Usage:
+    python ai-scraper/bench_pipeline.py [--mode single|batch] [--animals N]
+        [--latency gemini=0.5,wiki=0.05] [--error-rate gemini=0.02] [--payload images=2400]
+    python ai-scraper/bench_pipeline.py --compress [--image-dir DIR] [--repeat N]
+"""
+import argparse
+import asyncio
+import contextlib
+import json
+import math
+import os
+import random
+import re
+import sys
+import tempfile
+import threading
+import time
+import zlib
+from types import SimpleNamespace
+
+SCRAPER_DIR = os.path.dirname(os.path.abspath(__file__))
+
+class ServiceProfile:
+    """
+    How a fake service behaves: mean latency per call in seconds, the fraction of calls that
+    fail, and a service-specific payload size (see DEFAULT_PROFILES).
+    """
+
+    def __init__(self, latency, error_rate=0.0, payload=0, jitter=0.25):
+        self.latency = latency
+        self.error_rate = error_rate
+        self.payload = payload
+        self.jitter = jitter
+
+    def delay(self):
+        return max(0.0, random.gauss(self.latency, self.latency * self.jitter))
+
+    def wait(self):
+        time.sleep(self.delay())
+
+    def maybe_fail(self, what):
+        if random.random() < self.error_rate:
+            raise FakeServiceError(f"{what}: injected failure")
+
+class FakeServiceError(Exception):
+    pass
+
+# payload: gemini = characters per generated section, wiki = extract characters,
+# serpapi = image results per search, images = longest side of served images in pixels
+DEFAULT_PROFILES = {
+    "gemini": ServiceProfile(latency=0.5, payload=1500),
+    "wiki": ServiceProfile(latency=0.05, payload=20000),
+    "serpapi": ServiceProfile(latency=0.3, payload=20),
+    "images": ServiceProfile(latency=0.05, payload=1600),
+    "supabase": ServiceProfile(latency=0.03),
+}
+
+FILLER = ("The animal lives in a wide range of habitats and is known for its remarkable adaptations. "
+          "Measurements vary between populations, with adults reaching 1.2 meters and 40 kilograms. ")
+
+def filler(length):
+    return (FILLER * (length // len(FILLER) + 1))[:length]
+
+def fake_response(text, prompt):
+    """An object shaped like a google.generativeai response (or stream chunk)."""
+    part = SimpleNamespace(text=text)
+    usage = SimpleNamespace(
+        prompt_token_count=len(prompt) // 4,
+        candidates_token_count=len(text) // 4,
+        total_token_count=(len(prompt) + len(text)) // 4,
+    )
+    return SimpleNamespace(candidates=[SimpleNamespace(content=SimpleNamespace(parts=[part]))], usage_metadata=usage)
+
+class FakeGeminiModel:
+    """Answers the article, name, translation and section prompts with text of the configured length."""
+
+    STREAM_CHUNKS = 8
+
+    def __init__(self, profile):
+        self.profile = profile
+
+    def generate_content(self, prompt, generation_config=None, stream=False):
+        text = self._respond(prompt, generation_config)
+        if stream:
+            return self._stream(prompt, text)
+        self.profile.wait()
+        self.profile.maybe_fail("gemini")
+        return fake_response(text, prompt)
+
+    def _stream(self, prompt, text):
+        size = math.ceil(len(text) / self.STREAM_CHUNKS) or 1
+        for start in range(0, len(text), size):
+            time.sleep(self.profile.delay() / self.STREAM_CHUNKS)
+            self.profile.maybe_fail("gemini stream")
+            yield fake_response(text[start:start + size], prompt)
+
+    def _respond(self, prompt, generation_config):
+        if generation_config and generation_config.get("response_mime_type") == "application/json":
+            name = re.search(r"^Name: (.*)$", prompt, re.MULTILINE)
+            name = f"{name.group(1) if name else 'Animal'} (translated)"
+            return json.dumps({"name": name, "article": f"**Overview**\n{filler(self.profile.payload)}"})
+        heading = re.search(r"^[ \t]*(\*\*[^*\n]+\*\*)", prompt, re.MULTILINE)
+        if heading:
+            # A section translation keeps its heading
+            return f"{heading.group(1)}\n{filler(self.profile.payload)}"
+        categories = re.findall(r"^(\w[^\n]*)\n- ", prompt, re.MULTILINE) or ["Overview"]
+        per_category = self.profile.payload // len(categories)
+        return "\n\n".join(f"**{category.strip()}**\n{filler(per_category)}" for category in categories)
+
+def wiki_response_data(params, extract_size):
+    """MediaWiki API JSON for the search, titles= and extracts queries the fetchers send. Page IDs derive from titles."""
+    if params.get("list") == "search":
+        return {"query": {"search": [{"title": params["srsearch"]}]}}
+    titles = str(params.get("titles", "")).split("|")
+    pages = {
+        str(page_id): {"pageid": page_id, "title": title, "revisions": [{"revid": page_id * 10}]}
+        for title in titles for page_id in [zlib.crc32(title.encode())]
+    }
+    if params.get("prop", "").startswith("extracts"):
+        page = next(iter(pages.values()))
+        return {"query": {"pages": {str(page["pageid"]): {**page, "extract": filler(extract_size)}}}}
+    return {"query": {"pages": pages}}
+
+class FakeHTTPResponse:
+    def __init__(self, content, headers=None, data=None):
+        self.content = content
+        self.headers = headers or {}
+        self.status_code = 200
+        self._data = data
+
+    def raise_for_status(self):
+        pass
+
+    def json(self):
+        return self._data
+
+    def iter_content(self, chunk_size=1):
+        for start in range(0, len(self.content), chunk_size):
+            yield self.content[start:start + chunk_size]
+
+    def close(self):
+        pass
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        return False
+
+class FakeWikiSession:
+    """Stands in for the requests session of the synchronous Wikipedia fetchers."""
+
+    def __init__(self, profile):
+        self.profile = profile
+
+    def get(self, url, params=None, timeout=None):
+        self.profile.wait()
+        self.profile.maybe_fail("wikipedia")
+        data = wiki_response_data(params, self.profile.payload)
+        return FakeHTTPResponse(json.dumps(data).encode(), data=data)
+
+class FakeAsyncWikiClient:
+    """Stands in for the pooled httpx.AsyncClient of the batched Wikipedia fetchers."""
+
+    def __init__(self, profile):
+        self.profile = profile
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc_info):
+        return False
+
+    async def get(self, url, params=None):
+        await asyncio.sleep(self.profile.delay())
+        self.profile.maybe_fail("wikipedia")
+        data = wiki_response_data(params, self.profile.payload)
+        return FakeHTTPResponse(json.dumps(data).encode(), data=data)
+
+class FakeImageSession:
+    """Serves images from the synthetic corpus; each animal's results map to distinct images."""
+
+    def __init__(self, profile, corpus):
+        self.profile = profile
+        self.corpus = corpus
+
+    def get(self, url, timeout=None, **kwargs):
+        self.profile.wait()
+        self.profile.maybe_fail("image download")
+        keyword, number = url.rsplit("/", 2)[-2:]
+        index = (zlib.crc32(keyword.encode()) + int(number.split(".")[0])) % len(self.corpus)
+        image = self.corpus[index]
+        return FakeHTTPResponse(image, headers={"Content-Type": "image/jpeg", "Content-Length": str(len(image))})
+
+    def close(self):
+        pass
+
+def fake_search_images(profile):
+    def search_images(keyword):
+        profile.wait()
+        profile.maybe_fail("serpapi")
+        slug = keyword.replace(" ", "_")
+        return [{"original": f"https://images.invalid/{slug}/{n}.jpg"} for n in range(profile.payload)]
+    return search_images
+
+class FakeResult:
+    def __init__(self, data):
+        self.data = data
+
+class FakeQuery:
+    def __init__(self, db, table):
+        self.db = db
+        self.table = table
+        self.filters = []
+
+    def select(self, columns="*"):
+        return self
+
+    def eq(self, column, value):
+        self.filters.append((column, value))
+        return self
+
+    def execute(self):
+        self.db.profile.wait()
+        self.db.profile.maybe_fail("select")
+        with self.db.lock:
+            rows = [{"name": name} for name in self.db.animals]
+        return FakeResult([row for row in rows if all(row.get(col) == value for col, value in self.filters)])
+
+class FakeCall:
+    def __init__(self, func):
+        self.func = func
+
+    def execute(self):
+        return FakeResult(self.func())
+
+class FakeBucket:
+    def __init__(self, db, name):
+        self.db = db
+        self.name = name
+
+    def upload(self, path, data, options=None):
+        self.db.profile.wait()
+        self.db.profile.maybe_fail("upload")
+        with self.db.lock:
+            self.db.objects[path] = len(data)
+
+    def list(self, folder, options=None):
+        self.db.profile.wait()
+        with self.db.lock:
+            return [{"name": os.path.basename(path)} for path in self.db.objects
+                    if os.path.dirname(path) == folder]
+
+    def get_public_url(self, path):
+        return f"https://storage.invalid/{self.name}/{path}"
+
+class FakeSupabase:
+    """In-memory stand-in for the Supabase client: the animals table, Storage and both RPCs."""
+
+    def __init__(self, profile):
+        self.profile = profile
+        self.lock = threading.Lock()
+        self.animals = {}
+        self.objects = {}
+        self.storage = SimpleNamespace(from_=lambda bucket: FakeBucket(self, bucket))
+
+    def table(self, name):
+        return FakeQuery(self, name)
+
+    def rpc(self, function, payload):
+        return FakeCall(lambda: self._rpc(function, payload))
+
+    def _rpc(self, function, payload):
+        self.profile.wait()
+        self.profile.maybe_fail(function)
+        if function == "add_animal_full":
+            with self.lock:
+                self.animals[payload["p_animal_name"]] = payload
+            return None
+        rows = []
+        for animal in payload["p_animals"]:
+            try:
+                self.profile.maybe_fail(animal["p_animal_name"])
+            except FakeServiceError as e:
+                rows.append({"name": animal["p_animal_name"], "status": "error", "error": str(e)})
+                continue
+            with self.lock:
+                self.animals[animal["p_animal_name"]] = animal
+            rows.append({"name": animal["p_animal_name"], "status": "ok", "error": None})
+        return rows
+
+def image_corpus(count, longest_side):
+    """Distinct photo-like JPEGs with the proportions of a typical 3:2 photo."""
+    from bench_compress import synthetic_image
+
+    return [synthetic_image(longest_side, longest_side * 2 // 3, seed) for seed in range(count)]
+
+def install_fakes(profiles, corpus):
+    """Points every client accessor of the scraper modules at the fakes."""
+    import db_service
+    import fetch_animal_images
+    import fetch_wiki_page
+    import gemini
+
+    model = FakeGeminiModel(profiles["gemini"])
+    wiki_session = FakeWikiSession(profiles["wiki"])
+    supabase = FakeSupabase(profiles["supabase"])
+
+    gemini.get_model = lambda: model
+    fetch_wiki_page.get_session = lambda: wiki_session
+    fetch_wiki_page.create_async_client = lambda: FakeAsyncWikiClient(profiles["wiki"])
+    fetch_animal_images.search_images = fake_search_images(profiles["serpapi"])
+    fetch_animal_images.create_session = lambda: FakeImageSession(profiles["images"], corpus)
+    db_service.get_supabase = lambda: supabase
+
+def use_scratch_dir(path, animal_count):
+    """Sends all local state to `path` and seeds it with an animals.txt of `animal_count` names."""
+    os.environ["SCRAPER_DATA_DIR"] = os.path.join(path, ".scraper")
+    os.environ["SCRAPER_CACHE_DISABLED"] = "1"
+    os.makedirs(os.path.join(path, "ai-scraper"))
+    with open(os.path.join(path, "ai-scraper", "animals.txt"), "w") as f:
+        f.writelines(f"Benchmark Animal {n:04d}\n" for n in range(animal_count))
+    os.chdir(path)
+    sys.path.insert(0, SCRAPER_DIR)
+
+def percentile(values, q):
+    """Nearest-rank percentile."""
+    ordered = sorted(values)
+    if not ordered:
+        return 0.0
+    return ordered[min(len(ordered) - 1, max(0, math.ceil(q / 100 * len(ordered)) - 1))]
+
+def print_percentiles(title, groups):
+    print(f"\n{title}")
+    print(f"  {'name':<22} {'count':>6} {'p50 (s)':>9} {'p90 (s)':>9} {'p99 (s)':>9} {'max (s)':>9}")
+    for name, values in groups.items():
+        print(f"  {name:<22} {len(values):>6} {percentile(values, 50):>9.3f} {percentile(values, 90):>9.3f} "
+              f"{percentile(values, 99):>9.3f} {max(values):>9.3f}")
+
+def report(entries, done, elapsed):
+    """Prints latency percentiles from the instrumentation records of the run."""
+    stages, calls, windows = {}, {}, {}
+    for entry in entries:
+        if entry["span"] == "stage":
+            stages.setdefault(entry["stage"], []).append(entry["duration_s"])
+            start, end = windows.get(entry["animal"], (math.inf, -math.inf))
+            windows[entry["animal"]] = (min(start, entry["started_at"]),
+                                        max(end, entry["started_at"] + entry["duration_s"]))
+        else:
+            calls.setdefault(entry["span"], []).append(entry["duration_s"])
+
+    end_to_end = [end - start for name, (start, end) in windows.items() if name in done]
+    print(f"\n{len(done)} of {len(windows)} animals ingested in {elapsed:.1f}s: "
+          f"{len(done) / elapsed * 60:.2f} animals/min")
+    if end_to_end:
+        print_percentiles("End-to-end latency per ingested animal:", {"animal": end_to_end})
+    print_percentiles("Stage latency:", stages)
+    print_percentiles("Call latency:", dict(sorted(calls.items())))
+
+def run_pipeline_benchmark(args):
+    profiles = DEFAULT_PROFILES
+    for option in ("latency", "error_rate", "payload"):
+        for service, value in getattr(args, option).items():
+            setattr(profiles[service], option, value)
+
+    # The Gemini scheduler reads its quota at import time; unlimited unless a quota is being benchmarked
+    os.environ["GEMINI_REQUESTS_PER_MINUTE"] = str(args.gemini_rpm)
+    os.environ["GEMINI_TOKENS_PER_MINUTE"] = str(args.gemini_tpm)
+
+    with tempfile.TemporaryDirectory(prefix="bench-pipeline-") as scratch:
+        cwd = os.getcwd()
+        use_scratch_dir(scratch, args.animals)
+        try:
+            # Imported only now, so the modules pick up the scratch directories
+            import catalog
+            import index
+            import instrumentation
+
+            concurrency = index.parse_concurrency(args.concurrency) if args.concurrency else None
+            print(f"Generating {args.corpus} synthetic images...")
+            install_fakes(profiles, image_corpus(args.corpus, profiles["images"].payload))
+
+            print(f"Running {args.animals} animals in {args.mode} mode...")
+            output = sys.stdout if args.verbose else open(os.devnull, "w")
+            start = time.perf_counter()
+            with contextlib.redirect_stdout(output):
+                if args.mode == "batch":
+                    catalog.sync_with_database()
+                    index.batch_main(catalog.get_catalog().sample_pending(args.animals), concurrency, args.languages)
+                else:
+                    for _ in range(args.animals):
+                        try:
+                            index.main(args.languages)
+                        except Exception as e:
+                            print(f"Run failed: {e}")
+            elapsed = time.perf_counter() - start
+
+            report(instrumentation.records(), set(catalog.get_catalog().names(catalog.DONE)), elapsed)
+            if args.report:
+                instrumentation.write_report(os.path.join(cwd, args.report))
+        finally:
+            os.chdir(cwd)
+
+def run_compress_benchmark(args):
+    sys.path.insert(0, SCRAPER_DIR)
+    from bench_compress import load_corpus
+    from fetch_animal_images import compress_image_with_stats
+
+    corpus = load_corpus(args.image_dir)
+    durations = {}
+    bytes_in = 0
+    start = time.perf_counter()
+    for _ in range(args.repeat):
+        for name, image_data in corpus:
+            image_start = time.perf_counter()
+            compress_image_with_stats(image_data)
+            durations.setdefault(name, []).append(time.perf_counter() - image_start)
+            bytes_in += len(image_data)
+    elapsed = time.perf_counter() - start
+
+    print_percentiles("compress_image latency per image:", durations)
+    print_percentiles("compress_image latency, whole corpus:", {"all": [d for runs in durations.values() for d in runs]})
+    print(f"\n{len(corpus) * args.repeat} images in {elapsed:.1f}s: {bytes_in / elapsed / 1024 / 1024:.2f} MB/s of input")
+
+def parse_settings(value):
+    """Parses 'gemini=0.5,wiki=0.05' into a dict of per-service numbers."""
+    settings = {}
+    for part in value.split(","):
+        service, _, number = part.partition("=")
+        try:
+            settings[service] = float(number)
+        except ValueError:
+            raise argparse.ArgumentTypeError(f"Invalid setting: {part}")
+        if service not in DEFAULT_PROFILES:
+            raise argparse.ArgumentTypeError(f"Unknown service {service}; expected one of {', '.join(DEFAULT_PROFILES)}")
+    return settings
+
+def parse_payloads(value):
+    return {service: int(size) for service, size in parse_settings(value).items()}
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark the ingestion pipeline against local fake services.")
+    parser.add_argument("--mode", choices=["single", "batch"], default="batch",
+                        help="index.main() once per animal, or one index.batch_main() (default: %(default)s)")
+    parser.add_argument("--animals", type=int, default=10, help="animals to ingest (default: %(default)s)")
+    parser.add_argument("--languages", nargs="+", default=["pl"], metavar="CODE")
+    parser.add_argument("--concurrency", default=None, metavar="STAGE=N,...",
+                        help="batch mode workers per stage, as for index.py")
+    parser.add_argument("--latency", type=parse_settings, default={}, metavar="SERVICE=SECONDS,...",
+                        help=f"mean latency per call; services: {', '.join(DEFAULT_PROFILES)}")
+    parser.add_argument("--error-rate", type=parse_settings, default={}, metavar="SERVICE=FRACTION,...",
+                        help="fraction of calls that fail")
+    parser.add_argument("--payload", type=parse_payloads, default={}, metavar="SERVICE=SIZE,...",
+                        help="gemini/wiki: characters, serpapi: results per search, images: longest side in px")
+    parser.add_argument("--gemini-rpm", type=int, default=0,
+                        help="Gemini requests/min the scheduler allows (default: unlimited)")
+    parser.add_argument("--gemini-tpm", type=int, default=0,
+                        help="Gemini tokens/min the scheduler allows (default: unlimited)")
+    parser.add_argument("--corpus", type=int, default=12, help="distinct synthetic images served (default: %(default)s)")
+    parser.add_argument("--report", metavar="PATH", help="also write the instrumentation records as JSON lines")
+    parser.add_argument("--verbose", action="store_true", help="show the pipeline's own output")
+    parser.add_argument("--compress", action="store_true", help="benchmark compress_image instead of the pipeline")
+    parser.add_argument("--image-dir", help="with --compress: use these images instead of the synthetic corpus")
+    parser.add_argument("--repeat", type=int, default=3, help="with --compress: passes over the corpus (default: %(default)s)")
+    args = parser.parse_args()
+
+    if args.compress:
+        run_compress_benchmark(args)
+    else:
+        run_pipeline_benchmark(args)
@@ -0,0 +1,111 @@
+import hashlib
+import json
+import os
+import time
+from functools import lru_cache
+from instrumentation import add_to_current
+from local_store import DATA_DIR, SQLiteStore
+
+CACHE_TTL = int(os.getenv("SCRAPER_CACHE_TTL", 30 * 24 * 3600))  # 30 days in seconds
+CACHE_MAX_BYTES = int(os.getenv("SCRAPER_CACHE_MAX_BYTES", 256 * 1024 * 1024))  # 256MB
+CACHE_DISABLED = os.getenv("SCRAPER_CACHE_DISABLED") == "1"
+
+def make_key(endpoint, model, prompt, params=None):
+    """Content address of a request: a hash of everything that influences its response."""
+    payload = json.dumps([endpoint, model, prompt, params or {}], sort_keys=True, ensure_ascii=False, default=str)
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+class Cache(SQLiteStore):
+    """
+    Persistent SQLite-backed response cache.
+    Entries expire after `ttl` seconds, and the least recently used entries are evicted
+    once the stored values exceed `max_bytes`.
+    """
+
+    def __init__(self, path, ttl=CACHE_TTL, max_bytes=CACHE_MAX_BYTES):
+        self.path = path
+        self.ttl = ttl
+        self.max_bytes = max_bytes
+        super().__init__(path)
+        self._conn.execute("""
+            CREATE TABLE IF NOT EXISTS entries (
+                key TEXT PRIMARY KEY,
+                endpoint TEXT NOT NULL,
+                value TEXT NOT NULL,
+                size INTEGER NOT NULL,
+                created_at REAL NOT NULL,
+                accessed_at REAL NOT NULL
+            )
+        """)
+        self._conn.execute("CREATE INDEX IF NOT EXISTS entries_accessed_at ON entries (accessed_at)")
+
+    def get(self, key):
+        now = time.time()
+        with self._lock:
+            row = self._conn.execute("SELECT value, created_at FROM entries WHERE key = ?", (key,)).fetchone()
+            if row is None:
+                return None
+            value, created_at = row
+            if now - created_at > self.ttl:
+                self._conn.execute("DELETE FROM entries WHERE key = ?", (key,))
+                return None
+            self._conn.execute("UPDATE entries SET accessed_at = ? WHERE key = ?", (now, key))
+        return json.loads(value)
+
+    def set(self, key, value, endpoint=""):
+        data = json.dumps(value, ensure_ascii=False)
+        now = time.time()
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO entries (key, endpoint, value, size, created_at, accessed_at) "
+                "VALUES (?, ?, ?, ?, ?, ?)",
+                (key, endpoint, data, len(data.encode("utf-8")), now, now),
+            )
+            self._evict(now)
+
+    def _evict(self, now):
+        self._conn.execute("DELETE FROM entries WHERE created_at < ?", (now - self.ttl,))
+        total = self._conn.execute("SELECT COALESCE(SUM(size), 0) FROM entries").fetchone()[0]
+        if total <= self.max_bytes:
+            return
+        evicted = []
+        for key, size in self._conn.execute("SELECT key, size FROM entries ORDER BY accessed_at").fetchall():
+            if total <= self.max_bytes:
+                break
+            evicted.append((key,))
+            total -= size
+        self._conn.executemany("DELETE FROM entries WHERE key = ?", evicted)
+
+    def clear(self):
+        with self._lock:
+            self._conn.execute("DELETE FROM entries")
+
+@lru_cache(maxsize=None)
+def get_cache():
+    return Cache(os.path.join(DATA_DIR, "cache.sqlite3"))
+
+def lookup(endpoint, model, prompt, params=None):
+    """Returns the cached response for this request, or None."""
+    if CACHE_DISABLED:
+        return None
+    return get_cache().get(make_key(endpoint, model, prompt, params))
+
+def store(endpoint, model, prompt, params, value):
+    """Stores a response. Empty results (None or "") are never stored, so failed lookups are retried next time."""
+    if CACHE_DISABLED or not value:
+        return
+    get_cache().set(make_key(endpoint, model, prompt, params), value, endpoint)
+
+def cached(endpoint, model, prompt, params, compute, valid=None):
+    """
+    Returns the cached response for this request, or calls `compute()` and stores its result.
+    `valid(value)` can reject a cached response, e.g. one older than the caller needs.
+    """
+    value = lookup(endpoint, model, prompt, params)
+    if value is not None and (valid is None or valid(value)):
+        print(f"Cache hit for {endpoint}")
+        add_to_current("cache_hits")
+        return value
+    value = compute()
+    store(endpoint, model, prompt, params, value)
+    return value
@@ -0,0 +1,200 @@
+import os
+import random
+import time
+from functools import lru_cache
+from local_store import DATA_DIR, SQLiteStore
+
+ANIMALS_FILE = 'ai-scraper/animals.txt'
+
+PENDING = "pending"
+DONE = "done"
+FAILED = "failed"
+
+RETRY_FAILED_AFTER = int(os.getenv("SCRAPER_RETRY_FAILED_AFTER", 6 * 3600))  # seconds before a failed animal is pending again
+
+class Catalog(SQLiteStore):
+    """
+    Persistent local index of every animal name with its ingestion status, last attempt and
+    the Wikipedia page and revision its article was generated from.
+    Pending animals occupy the dense slots 0..n-1, so a uniform random pick is one indexed
+    lookup. When an animal leaves the pending set, the last slot is moved into its place.
+    """
+
+    def __init__(self, path):
+        super().__init__(path)
+        self._conn.execute("""
+            CREATE TABLE IF NOT EXISTS animals (
+                name TEXT PRIMARY KEY,
+                status TEXT NOT NULL,
+                slot INTEGER UNIQUE,
+                last_attempt REAL,
+                wiki_title TEXT,
+                error TEXT,
+                wiki_page_id INTEGER,
+                wiki_revision_id INTEGER
+            )
+        """)
+        # Catalogs created before revisions were tracked lack the last two columns
+        columns = {row[1] for row in self._conn.execute("PRAGMA table_info(animals)")}
+        for column in ("wiki_page_id", "wiki_revision_id"):
+            if column not in columns:
+                self._conn.execute(f"ALTER TABLE animals ADD COLUMN {column} INTEGER")
+
+    def _pending_count(self):
+        # Slots are dense, so this is an index lookup rather than a scan
+        return self._conn.execute("SELECT COALESCE(MAX(slot) + 1, 0) FROM animals").fetchone()[0]
+
+    def _release_slot(self, slot):
+        last = self._pending_count() - 1
+        self._conn.execute("UPDATE animals SET slot = NULL WHERE slot = ?", (slot,))
+        if slot != last:
+            self._conn.execute("UPDATE animals SET slot = ? WHERE slot = ?", (slot, last))
+
+    def import_names(self, names):
+        """Adds names that aren't in the catalog yet as pending. Returns how many were added."""
+        added = 0
+        with self._lock:
+            self._conn.execute("BEGIN")
+            next_slot = self._pending_count()
+            for name in dict.fromkeys(names):
+                cursor = self._conn.execute(
+                    "INSERT OR IGNORE INTO animals (name, status, slot) VALUES (?, ?, ?)", (name, PENDING, next_slot)
+                )
+                if cursor.rowcount:
+                    next_slot += 1
+                    added += 1
+            self._conn.execute("COMMIT")
+        return added
+
+    def pending_count(self):
+        with self._lock:
+            return self._pending_count()
+
+    def sample_pending(self, count=1):
+        """Returns up to `count` distinct pending names, chosen uniformly at random."""
+        with self._lock:
+            total = self._pending_count()
+            slots = random.sample(range(total), min(count, total))
+            return [
+                self._conn.execute("SELECT name FROM animals WHERE slot = ?", (slot,)).fetchone()[0]
+                for slot in slots
+            ]
+
+    def pick_pending(self):
+        picked = self.sample_pending(1)
+        return picked[0] if picked else None
+
+    def set_status(self, name, status, wiki_title=None, error=None, page_id=None, revision_id=None):
+        with self._lock:
+            self._conn.execute("BEGIN")
+            self._set_status(name, status, wiki_title, error, page_id, revision_id)
+            self._conn.execute("COMMIT")
+
+    def _set_status(self, name, status, wiki_title=None, error=None, page_id=None, revision_id=None):
+        row = self._conn.execute("SELECT status, slot FROM animals WHERE name = ?", (name,)).fetchone()
+        if row is None:
+            self._conn.execute("INSERT INTO animals (name, status) VALUES (?, ?)", (name, FAILED))
+            row = (FAILED, None)
+        current, slot = row
+
+        if current == PENDING and status != PENDING:
+            self._release_slot(slot)
+        elif current != PENDING and status == PENDING:
+            self._conn.execute("UPDATE animals SET slot = ? WHERE name = ?", (self._pending_count(), name))
+
+        self._conn.execute(
+            "UPDATE animals SET status = ?, last_attempt = ?, error = ?, wiki_title = COALESCE(?, wiki_title), "
+            "wiki_page_id = COALESCE(?, wiki_page_id), wiki_revision_id = COALESCE(?, wiki_revision_id) "
+            "WHERE name = ?",
+            (status, time.time(), error, wiki_title, page_id, revision_id, name),
+        )
+
+    def mark_done(self, name, wiki_title=None, page_id=None, revision_id=None):
+        self.set_status(name, DONE, wiki_title, page_id=page_id, revision_id=revision_id)
+
+    def mark_failed(self, name, error=None):
+        self.set_status(name, FAILED, error=str(error) if error is not None else None)
+
+    def requeue_failed(self, cooldown=RETRY_FAILED_AFTER):
+        """Returns animals whose last failed attempt is at least `cooldown` seconds old to the pending set."""
+        with self._lock:
+            self._conn.execute("BEGIN")
+            names = [name for name, in self._conn.execute(
+                "SELECT name FROM animals WHERE status = ? AND COALESCE(last_attempt, 0) <= ?",
+                (FAILED, time.time() - cooldown),
+            )]
+            for name in names:
+                self._set_status(name, PENDING)
+            self._conn.execute("COMMIT")
+        return len(names)
+
+    def recently_failed(self, cooldown=RETRY_FAILED_AFTER):
+        """Names of animals whose last attempt failed less than `cooldown` seconds ago."""
+        with self._lock:
+            return {name for name, in self._conn.execute(
+                "SELECT name FROM animals WHERE status = ? AND last_attempt > ?", (FAILED, time.time() - cooldown)
+            )}
+
+    def sync_done(self, names):
+        """Marks every name already present in the database as done, in one transaction."""
+        with self._lock:
+            self._conn.execute("BEGIN")
+            known = {
+                name for name, in self._conn.execute("SELECT name FROM animals WHERE status != ?", (DONE,))
+            }
+            synced = [name for name in names if name in known]
+            for name in synced:
+                self._set_status(name, DONE)
+            self._conn.execute("COMMIT")
+        return len(synced)
+
+    def set_revision(self, name, page_id, revision_id, wiki_title=None):
+        with self._lock:
+            self._conn.execute(
+                "UPDATE animals SET wiki_page_id = ?, wiki_revision_id = ?, wiki_title = COALESCE(?, wiki_title) "
+                "WHERE name = ?",
+                (page_id, revision_id, wiki_title, name),
+            )
+
+    def wiki_revisions(self):
+        """(name, wiki_title, page_id, revision_id) of every done animal, with None for what isn't known."""
+        with self._lock:
+            return self._conn.execute(
+                "SELECT name, wiki_title, wiki_page_id, wiki_revision_id FROM animals WHERE status = ? ORDER BY name",
+                (DONE,),
+            ).fetchall()
+
+    def names(self, status):
+        with self._lock:
+            return [name for name, in self._conn.execute(
+                "SELECT name FROM animals WHERE status = ? ORDER BY name", (status,)
+            )]
+
+def read_animals_file(path=ANIMALS_FILE):
+    with open(path) as f:
+        return [line.strip() for line in f if line.strip()]
+
+@lru_cache(maxsize=None)
+def get_catalog():
+    """
+    The shared catalog, seeded with any names from animals.txt it doesn't know yet. Animals that
+    failed at least RETRY_FAILED_AFTER seconds ago go back to pending, so a transient error doesn't
+    drop an animal from the backlog.
+    """
+    catalog = Catalog(os.path.join(DATA_DIR, "catalog.sqlite3"))
+    added = catalog.import_names(read_animals_file())
+    if added:
+        print(f"Added {added} animals to the catalog")
+    requeued = catalog.requeue_failed()
+    if requeued:
+        print(f"Returned {requeued} previously failed animals to pending")
+    return catalog
+
+def sync_with_database(client=None):
+    """Marks animals that are already in the Supabase animals table as done, using one bulk query."""
+    import db_service
+
+    names = db_service.get_all_animal_names(client)
+    synced = get_catalog().sync_done(names)
+    print(f"Catalog synced: {synced} animals newly marked done, {get_catalog().pending_count()} pending")
+    return synced
@@ -0,0 +1,78 @@
+import json
+import os
+import time
+from functools import lru_cache
+from local_store import DATA_DIR, SQLiteStore
+
+# Pipeline stages in the order they run; each one's output is checkpointed under its name
+STAGES = ["article", "translations", "images", "uploaded"]
+
+class CheckpointStore(SQLiteStore):
+    """
+    Durable per-animal record of completed pipeline stages, so a failed run can resume from the
+    last completed stage instead of paying for the Gemini and SerpAPI work again.
+    """
+
+    def __init__(self, path):
+        super().__init__(path)
+        self._conn.execute("""
+            CREATE TABLE IF NOT EXISTS checkpoints (
+                animal TEXT NOT NULL,
+                stage TEXT NOT NULL,
+                data TEXT NOT NULL,
+                updated_at REAL NOT NULL,
+                PRIMARY KEY (animal, stage)
+            )
+        """)
+
+    def save(self, animal, stage, data):
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO checkpoints (animal, stage, data, updated_at) VALUES (?, ?, ?, ?)",
+                (animal, stage, json.dumps(data, ensure_ascii=False), time.time()),
+            )
+
+    def load(self, animal, stage):
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT data FROM checkpoints WHERE animal = ? AND stage = ?", (animal, stage)
+            ).fetchone()
+        return json.loads(row[0]) if row else None
+
+    def completed_stages(self, animal):
+        with self._lock:
+            done = {stage for stage, in self._conn.execute(
+                "SELECT stage FROM checkpoints WHERE animal = ?", (animal,)
+            )}
+        return [stage for stage in STAGES if stage in done]
+
+    def animals(self):
+        """Animals with unfinished work, least recently touched first."""
+        with self._lock:
+            return [animal for animal, in self._conn.execute(
+                "SELECT animal FROM checkpoints GROUP BY animal ORDER BY MAX(updated_at)"
+            )]
+
+    def clear(self, animal):
+        with self._lock:
+            self._conn.execute("DELETE FROM checkpoints WHERE animal = ?", (animal,))
+
+@lru_cache(maxsize=None)
+def get_checkpoints():
+    return CheckpointStore(os.path.join(DATA_DIR, "checkpoints.sqlite3"))
+
+def checkpointed(animal, stage, compute, dump=lambda value: value, load=lambda data: data, valid=None):
+    """
+    Returns the checkpointed output of `stage` for `animal`, or runs `compute()` and checkpoints
+    its result. `valid(value)` can reject a stale checkpoint, e.g. when files it points to are gone.
+    """
+    store = get_checkpoints()
+    data = store.load(animal, stage)
+    if data is not None:
+        value = load(data)
+        if valid is None or valid(value):
+            print(f"Resuming {animal}: reusing {stage} checkpoint")
+            return value
+    value = compute()
+    store.save(animal, stage, dump(value))
+    return value
@@ -1,74 +1,144 @@
 import os
-import glob
+import hashlib
+from concurrent.futures import ThreadPoolExecutor
+from functools import lru_cache
 from time import sleep
+from typing import TYPE_CHECKING
 from animal import Animal
+from backoff import backoff_delay
+from instrumentation import span, add_to_current
 from translation import Translation
-from supabase import create_client, Client  # type: ignore
 import dotenv
 
+if TYPE_CHECKING:
+    from supabase import Client  # type: ignore
+
 dotenv.load_dotenv()
 
-# Initialize Supabase client and storage bucket
 SUPABASE_URL: str = os.getenv("SUPABASE_URL")
 SUPABASE_KEY: str = os.getenv("SUPABASE_KEY")
-SUPABASE: Client = create_client(SUPABASE_URL, SUPABASE_KEY)
 BUCKET_NAME = "animal_photos"
+RPC_BATCH_SIZE = 25  # animals per add_animals_full call
+NAME_LOOKUP_BATCH = 100  # names per in_() filter, keeps the request URL short
 
-def upload_and_verify(bucket, upload_path, file_data, max_retries=3, delay=1):
+@lru_cache(maxsize=None)
+def get_supabase() -> "Client":
     """
-    Uploads a file and verifies its presence in the bucket by checking for a public URL.
-    Retries the upload if verification fails.
+    Creates the Supabase client on first use, so importing this module needs neither the SDK
+    nor credentials.
     """
-    for attempt in range(max_retries):
-        print(f"Attempting to upload {upload_path}, attempt {attempt + 1}")
-        bucket.upload(upload_path, file_data)
-        sleep(delay)  # Ensure the upload completes
-        
-        public_url_response = bucket.get_public_url(upload_path)
-        
-        if isinstance(public_url_response, str) and public_url_response.startswith("http"):
-            print(f"Upload verified for {upload_path}")
-            return public_url_response
+    from supabase import create_client  # type: ignore
+
+    if not SUPABASE_URL or not SUPABASE_KEY:
+        raise ValueError("Please set SUPABASE_URL and SUPABASE_KEY in .env file")
+    return create_client(SUPABASE_URL, SUPABASE_KEY)
+
+UPLOAD_WORKERS = 4
+LIST_LIMIT = 1000  # storage list() returns 100 objects by default
 
-        print(f"Verification failed for {upload_path}. Retrying ({attempt + 1}/{max_retries})...")
+def content_hash_path(folder, file_data, extension=".webp"):
+    """Object path derived from the file contents, so re-running an animal maps to the same objects."""
+    return f"{folder}/{hashlib.sha256(file_data).hexdigest()[:32]}{extension}"
 
-    print(f"Failed to upload {upload_path} after {max_retries} attempts")
-    return None
+def list_folder(bucket, folder):
+    """Names of the objects stored directly under `folder`, in a single request."""
+    return {item["name"] for item in bucket.list(folder, {"limit": LIST_LIMIT})}
+
+def upload_file(bucket, upload_path, file_data):
+    """Uploads one file. Returns False instead of raising, so one failure doesn't stop the batch."""
+    try:
+        with span("upload_file", path=upload_path, bytes=len(file_data)):
+            bucket.upload(upload_path, file_data, {"content-type": "image/webp"})
+        return True
+    except Exception as e:
+        print(f"Upload of {upload_path} failed: {e}")
+        return False
+
+def upload_and_verify(bucket, folder, files, max_retries=3):
+    """
+    Uploads `files` (a list of bytes) into `folder` under content-hashed names and returns
+    the public URLs of every file that is verifiably in the bucket, in the order given.
+    Objects already in the folder are skipped. Presence is checked with one listing of the
+    folder per attempt, and only the files still missing are retried, with backoff.
+    """
+    with span("upload_and_verify", folder=folder, files=len(files), bytes=sum(len(data) for data in files)):
+        return _upload_and_verify(bucket, folder, files, max_retries)
+
+def _upload_and_verify(bucket, folder, files, max_retries):
+    data_by_path = {}
+    for data in files:
+        data_by_path.setdefault(content_hash_path(folder, data), data)
+    paths = list(data_by_path)
+    stored = set()
+
+    for attempt in range(max_retries + 1):
+        stored = list_folder(bucket, folder)
+        missing = [path for path in paths if os.path.basename(path) not in stored]
+        if not missing or attempt == max_retries:
+            break
+        if attempt:
+            add_to_current("retries")
+            delay = backoff_delay(attempt)
+            print(f"{len(missing)} uploads to {folder} not verified. Retrying in {delay:.1f} seconds...")
+            sleep(delay)
+
+        print(f"Uploading {len(missing)} of {len(paths)} files to {folder}")
+        with ThreadPoolExecutor(max_workers=UPLOAD_WORKERS) as executor:
+            list(executor.map(lambda path: upload_file(bucket, path, data_by_path[path]), missing))
+
+    image_urls = []
+    for path in paths:
+        if os.path.basename(path) in stored:
+            image_urls.append(bucket.get_public_url(path))
+        else:
+            print(f"Failed to upload {path} after {max_retries} attempts")
+    print(f"Upload verified for {len(image_urls)} of {len(paths)} files in {folder}")
+    return image_urls
 
 
 def get_animal_by_name(animal_name: str):
     """Fetches the animal record by name, if it exists."""
-    response = SUPABASE.table("animals").select("*").eq("name", animal_name).execute()
+    response = get_supabase().table("animals").select("*").eq("name", animal_name).execute()
     return response.data[0] if response.data else None
 
 
-def add_animal_transactionally(animal: Animal, translations: list[Translation]) -> dict:
-    print(f"Starting transaction for animal: {animal.name}")
+def get_all_animal_names(client: "Client" = None) -> list[str]:
+    """Names of every animal in the database, in a single query."""
+    response = (client or get_supabase()).table("animals").select("name").execute()
+    return [row["name"] for row in response.data or []]
 
-    bucket = SUPABASE.storage.from_(BUCKET_NAME)
-    
-    # Check if animal already exists
-    existing_animal = get_animal_by_name(animal.name)
-    is_new = existing_animal is None
 
-    images_dir = "images"
-    image_paths = glob.glob(os.path.join(images_dir, f"{animal.name.replace(' ', '_')}_*.webp"))
-    
-    image_urls = []
+def get_image_urls(animal_names: list[str], client: "Client" = None) -> dict[str, list[str]]:
+    """Stored image URLs of the given animals as {name: [url]}."""
+    client = client or get_supabase()
+    names = list(animal_names)
+    image_urls = {}
+    for start in range(0, len(names), NAME_LOOKUP_BATCH):
+        response = (
+            client.table("animals")
+            .select("name, animal_images(image_url)")
+            .in_("name", names[start:start + NAME_LOOKUP_BATCH])
+            .execute()
+        )
+        for row in response.data or []:
+            image_urls[row["name"]] = [image["image_url"] for image in row.get("animal_images") or []]
+    return image_urls
 
+
+def upload_animal_images(animal: Animal, image_paths: list[str], client: "Client" = None) -> list[str]:
+    """Uploads the animal's compressed images (the paths its images stage saved) and returns their public URLs."""
+    bucket = (client or get_supabase()).storage.from_(BUCKET_NAME)
+
+    files = []
     for image_path in image_paths:
-        filename = os.path.basename(image_path)
-        upload_path = f"{animal.name}/{filename}"
-        
         with open(image_path, "rb") as f:
-            file_data = f.read()
+            files.append(f.read())
 
-        public_url = upload_and_verify(bucket, upload_path, file_data)
-        if public_url:
-            image_urls.append(public_url)
-        else:
-            print(f"Failed to verify upload of {filename}")
+    return upload_and_verify(bucket, animal.name, files)
 
+
+def build_animal_payload(animal: Animal, translations: list[Translation], image_urls: list[str]) -> dict:
+    """Arguments of the add_animal_full RPC."""
     translations_payload = [
         {
             "language": t.language,
@@ -76,14 +146,28 @@ def add_animal_transactionally(animal: Animal, translations: list[Translation])
         } for t in translations
     ]
 
-    # Prepare the payload
-    payload = {
+    return {
         "p_animal_name": animal.name,
         "p_animal_article": animal.article,
         "p_translations": translations_payload,
         "p_image_urls": image_urls
     }
 
+
+def add_animal_transactionally(animal: Animal, translations: list[Translation], image_urls: list[str] = None,
+                               image_paths: list[str] = ()) -> dict:
+    print(f"Starting transaction for animal: {animal.name}")
+
+    # Check if animal already exists
+    existing_animal = get_animal_by_name(animal.name)
+    is_new = existing_animal is None
+
+    if image_urls is None:
+        image_urls = upload_animal_images(animal, list(image_paths))
+
+    # Prepare the payload
+    payload = build_animal_payload(animal, translations, image_urls)
+
     # If the animal exists, use `update` instead of `insert`
     if is_new:
         print(f"Inserting new animal: {animal.name}")
@@ -91,13 +175,50 @@ def add_animal_transactionally(animal: Animal, translations: list[Translation])
         print(f"Updating existing animal: {animal.name}")
 
     try:
-        response = SUPABASE.rpc("add_animal_full", payload).execute()
+        with span("rpc", function="add_animal_full", animals=1):
+            response = get_supabase().rpc("add_animal_full", payload).execute()
         print(f"Transaction completed for {animal.name}")
         return response.data
     except Exception as e:
         print(f"Error updating animal: {e}")
         raise
 
+def add_animals_bulk(items: list[tuple[Animal, list[Translation], list[str]]],
+                     batch_size: int = RPC_BATCH_SIZE, client: "Client" = None) -> list[dict]:
+    """
+    Inserts or updates many animals with one add_animals_full RPC per batch
+    (see sql/add_animals_full.sql). Each item is (animal, translations, image_urls), with
+    images already uploaded. There is no per-animal existence lookup; the RPC upserts.
+    Returns one {"name", "status", "error"} dict per item, in input order; status is "ok" or "error".
+    """
+    client = client or get_supabase()
+    statuses = []
+
+    for start in range(0, len(items), batch_size):
+        batch = items[start:start + batch_size]
+        payload = {"p_animals": [build_animal_payload(*item) for item in batch]}
+        print(f"Writing animals {start + 1}-{start + len(batch)} of {len(items)}")
+
+        try:
+            with span("rpc", function="add_animals_full", animals=len(batch)):
+                response = client.rpc("add_animals_full", payload).execute()
+        except Exception as e:
+            print(f"Error writing batch: {e}")
+            statuses.extend({"name": animal.name, "status": "error", "error": str(e)} for animal, _, _ in batch)
+            continue
+
+        rows = {row["name"]: row for row in response.data or []}
+        for animal, _, _ in batch:
+            row = rows.get(animal.name)
+            if row is None:
+                statuses.append({"name": animal.name, "status": "error", "error": "missing from RPC response"})
+            else:
+                statuses.append({"name": animal.name, "status": row["status"], "error": row.get("error")})
+
+    failed = sum(1 for status in statuses if status["status"] != "ok")
+    print(f"Bulk write finished: {len(statuses) - failed} ok, {failed} failed")
+    return statuses
+
 # Example usage
 if __name__ == "__main__":
     new_animal = Animal(name="Sloth Bear", article="the")
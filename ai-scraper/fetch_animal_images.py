@@ -1,11 +1,16 @@
 import os
+import threading
+import multiprocessing
+from concurrent.futures import ThreadPoolExecutor, ProcessPoolExecutor, FIRST_COMPLETED, wait
 import requests
-from serpapi.google_search import GoogleSearch
 import dotenv
 from requests.adapters import HTTPAdapter
 from urllib3.util.retry import Retry
-from PIL import Image
+from PIL import Image, UnidentifiedImageError
 import io
+import time
+from instrumentation import span, record
+from image_index import dhash, find_near_duplicate, get_image_index, MAX_HASH_DISTANCE
 
 # Load environment variables
 dotenv.load_dotenv()
@@ -13,36 +18,222 @@ dotenv.load_dotenv()
 # Retrieve SerpAPI key from environment variables
 SERAPI_KEY: str = os.getenv("SERAPI_KEY")
 TARGET_SIZE = 200 * 1024  # 200KB in bytes
+MAX_DIMENSION = int(os.getenv("IMAGE_MAX_DIMENSION", 1600))  # longest side in pixels
+QUALITY_STEPS = list(range(5, 81, 5))  # WebP qualities tried, lowest to highest
+DOWNLOAD_WORKERS = 8
+COMPRESS_WORKERS = os.cpu_count() or 1
+REQUEST_TIMEOUT = 10  # seconds
+MAX_DOWNLOAD_BYTES = int(os.getenv("IMAGE_MAX_BYTES", 20 * 1024 * 1024))  # 20MB
+MIN_DIMENSION = int(os.getenv("IMAGE_MIN_DIMENSION", 400))  # shortest side in pixels
+MAX_PIXELS = 60_000_000  # anything bigger is more likely a scan or a decompression bomb than a photo
+ACCEPTED_FORMATS = {"JPEG", "PNG", "WEBP", "GIF", "BMP", "TIFF"}
+CHUNK_SIZE = 64 * 1024
+SNIFF_BYTES = 256 * 1024  # give up identifying an image if its header isn't within this many bytes
 
-def compress_image(image_data, max_size=TARGET_SIZE):
-    """Compress image to WebP format under specified size."""
-    # Open image from binary data
+# Define headers to mimic a browser
+HEADERS = {
+    'User-Agent': (
+        'Mozilla/5.0 (Windows NT 10.0; Win64; x64) '
+        'AppleWebKit/537.36 (KHTML, like Gecko) '
+        'Chrome/58.0.3029.110 Safari/537.3'
+    )
+}
+
+_compress_pool = None
+_compress_pool_lock = threading.Lock()
+
+def get_compress_pool():
+    """Process pool shared by every download so WebP encoding runs on all cores."""
+    global _compress_pool
+    with _compress_pool_lock:
+        if _compress_pool is None:
+            # spawn rather than fork: the pool may be created while other pipeline threads are running
+            _compress_pool = ProcessPoolExecutor(
+                max_workers=COMPRESS_WORKERS, mp_context=multiprocessing.get_context("spawn")
+            )
+    return _compress_pool
+
+def create_session():
+    """Requests session with a retry strategy and a connection pool sized for concurrent downloads."""
+    session = requests.Session()
+    retries = Retry(
+        total=3,
+        backoff_factor=1,
+        status_forcelist=[500, 502, 503, 504],
+        allowed_methods=["GET"]
+    )
+    adapter = HTTPAdapter(max_retries=retries, pool_maxsize=DOWNLOAD_WORKERS)
+    session.mount('http://', adapter)
+    session.mount('https://', adapter)
+    session.headers.update(HEADERS)
+    return session
+
+def prepare_image(image_data, max_dimension=MAX_DIMENSION):
+    """Decodes an image, downscales it to fit within `max_dimension` and flattens transparency."""
+    # Open image from binary data; this only reads the header
     img = Image.open(io.BytesIO(image_data))
-    
+
+    # Let the JPEG decoder downscale by 1/2, 1/4 or 1/8 while decoding, so a large photo is never
+    # decoded at full resolution. draft() keeps the result at least as big as the target size.
+    scale = max_dimension / max(img.size)
+    if img.format == "JPEG" and scale < 1:
+        img.draft(None, (max(1, int(img.width * scale)), max(1, int(img.height * scale))))
+
+    # Palette images are resized with nearest-neighbour only, so expand them first
+    if img.mode == 'P':
+        img = img.convert('RGBA')
+
+    # Never encode more pixels than the site can display. thumbnail() reduce()s by an integer
+    # factor before resampling, and everything below works on the smaller image.
+    img.thumbnail((max_dimension, max_dimension), Image.LANCZOS)
+
     # Convert to RGB if necessary (WebP doesn't support RGBA)
     if img.mode in ('RGBA', 'LA'):
         background = Image.new('RGB', img.size, (255, 255, 255))
         background.paste(img, mask=img.split()[-1])
         img = background
-    
-    # Start with quality 80 and adjust based on size
-    quality = 80
-    while quality > 5:  # Don't go below quality 5
-        buffer = io.BytesIO()
-        img.save(buffer, format="WEBP", quality=quality)
-        size = buffer.tell()
-        
-        if size <= max_size:
-            return buffer.getvalue()
-        
-        quality -= 10
-    
-    # If we get here, even lowest quality is too big
+    return img
+
+def encode_webp(img, quality, buffer):
+    """Encodes into the reused buffer and returns the encoded size."""
+    buffer.seek(0)
+    buffer.truncate()
+    img.save(buffer, format="WEBP", quality=quality)
+    return buffer.tell()
+
+def compress_image_with_stats(image_data, max_size=TARGET_SIZE, max_dimension=MAX_DIMENSION):
+    """
+    Compress image to WebP format under specified size.
+    Returns the WebP bytes and the number of encodes it took.
+    """
+    return encode_within_size(prepare_image(image_data, max_dimension), max_size)
+
+def encode_within_size(img, max_size=TARGET_SIZE):
+    """Encodes a prepared image at the highest quality step that fits `max_size`. Returns (bytes, encodes)."""
     buffer = io.BytesIO()
-    img.save(buffer, format="WEBP", quality=5)
-    return buffer.getvalue()
 
-def download_images_serpapi(keyword, num_images=5):
+    # Most downscaled photos fit at the highest quality straight away
+    encodes = 1
+    if encode_webp(img, QUALITY_STEPS[-1], buffer) <= max_size:
+        return buffer.getvalue(), encodes
+
+    # Most of the rest fit a step or two lower, so probe 1, 2, 4, 8... steps below the top until
+    # one fits, then binary search between it and the last step that didn't
+    best = None
+    top = failed = len(QUALITY_STEPS) - 1
+    distance = 1
+    while failed > 0:
+        step = max(top - distance, 0)
+        encodes += 1
+        if encode_webp(img, QUALITY_STEPS[step], buffer) <= max_size:
+            best = buffer.getvalue()
+            break
+        failed, distance = step, distance * 2
+
+    if best is not None:
+        low, high = step + 1, failed - 1
+        while low <= high:
+            mid = (low + high) // 2
+            encodes += 1
+            if encode_webp(img, QUALITY_STEPS[mid], buffer) <= max_size:
+                best = buffer.getvalue()
+                low = mid + 1
+            else:
+                high = mid - 1
+
+    # If nothing fits, the last encode was the lowest quality step; keep it
+    return (best if best is not None else buffer.getvalue()), encodes
+
+def compress_image(image_data, max_size=TARGET_SIZE, max_dimension=MAX_DIMENSION):
+    """Compress image to WebP format under specified size."""
+    return compress_image_with_stats(image_data, max_size, max_dimension)[0]
+
+def hash_and_compress(image_data, known_hashes=(), max_distance=MAX_HASH_DISTANCE):
+    """
+    Runs in the compress pool. Computes the perceptual hash of the decoded image and
+    returns (phash, webp_bytes), or (phash, None) when it is a near-duplicate of `known_hashes`,
+    in which case it is never encoded.
+    """
+    img = prepare_image(image_data)
+    phash = dhash(img)
+    if find_near_duplicate(phash, known_hashes, max_distance) is not None:
+        return phash, None
+    return phash, encode_within_size(img)[0]
+
+def timed_hash_and_compress(image_data, known_hashes=(), max_distance=MAX_HASH_DISTANCE):
+    """hash_and_compress plus its stats, measured inside the worker process: (phash, webp_bytes, stats)."""
+    start = time.perf_counter()
+    phash, data = hash_and_compress(image_data, known_hashes, max_distance)
+    stats = {
+        "duration": time.perf_counter() - start,
+        "bytes_in": len(image_data),
+        "bytes_out": len(data) if data else 0,
+        "duplicate": data is None,
+    }
+    return phash, data, stats
+
+def sniff_image(prefix):
+    """(format, (width, height)) read from the first bytes of an image file, or None if they don't tell yet."""
+    try:
+        img = Image.open(io.BytesIO(prefix))
+    except (UnidentifiedImageError, OSError):
+        return None
+    return img.format, img.size
+
+def check_image_header(image_format, size):
+    """Raises ValueError for images that aren't worth downloading in full."""
+    width, height = size
+    if image_format not in ACCEPTED_FORMATS:
+        raise ValueError(f"Unsupported image format {image_format}")
+    if min(width, height) < MIN_DIMENSION:
+        raise ValueError(f"Image too small ({width}x{height})")
+    if width * height > MAX_PIXELS:
+        raise ValueError(f"Image too large ({width}x{height})")
+
+def download_image(session, image_url, stop_event):
+    """
+    Streams one candidate image and rejects it as early as possible: on its Content-Type, on a
+    Content-Length over MAX_DOWNLOAD_BYTES, and on the format and dimensions in its first bytes.
+    Returns None if enough images were accepted in the meantime.
+    """
+    if stop_event.is_set():
+        return None
+    with span("download_image", url=image_url) as current, \
+            session.get(image_url, timeout=REQUEST_TIMEOUT, stream=True) as response:
+        response.raise_for_status()
+        if 'image' not in response.headers.get('Content-Type', ''):
+            raise ValueError("URL does not point to an image")
+        declared_size = int(response.headers.get('Content-Length') or 0)
+        if declared_size > MAX_DOWNLOAD_BYTES:
+            raise ValueError(f"Image too big ({declared_size} bytes)")
+
+        data = bytearray()
+        header = None
+        for chunk in response.iter_content(CHUNK_SIZE):
+            if stop_event.is_set():
+                return None
+            data += chunk
+            current.set(bytes=len(data))
+            if len(data) > MAX_DOWNLOAD_BYTES:
+                raise ValueError(f"Image too big (over {MAX_DOWNLOAD_BYTES} bytes)")
+            if header is None:
+                header = sniff_image(bytes(data))
+                if header is not None:
+                    check_image_header(*header)
+                    current.set(format=header[0], size="{}x{}".format(*header[1]))
+                elif len(data) >= SNIFF_BYTES:
+                    raise ValueError("Could not identify the image format")
+
+        if header is None:
+            # Small files can end before a header is recognised in a partial read
+            header = sniff_image(bytes(data))
+            if header is None:
+                raise ValueError("Could not identify the image format")
+            check_image_header(*header)
+        return bytes(data)
+
+def search_images(keyword):
+    """Google Images results for the animal from SerpAPI, as a list of {"original": url, ...} dicts."""
     # Define search parameters
     params = {
         "q": f"{keyword} animal",
@@ -50,90 +241,138 @@ def download_images_serpapi(keyword, num_images=5):
         "ijn": "0",
         "api_key": SERAPI_KEY
     }
-    
+
     # Perform the search
-    search = GoogleSearch(params)
-    results = search.get_dict()
-    images_results = results.get("images_results", [])
-    
-    if not images_results:
-        print("No image results found.")
-        return
-    
+    from serpapi.google_search import GoogleSearch
+
+    with span("serpapi_search", keyword=keyword) as current:
+        search = GoogleSearch(params)
+        results = search.get_dict()
+        images_results = results.get("images_results", [])
+        current.set(results=len(images_results))
+    return images_results
+
+def download_images_serpapi(keyword, num_images=5):
+    """
+    Downloads candidate images concurrently and compresses them in a process pool, with a bounded
+    number in flight, stopping as soon as `num_images` images are saved.
+    Near-duplicates of images already saved for this animal are rejected before encoding.
+    Returns the paths of the animal's saved images.
+    """
     # Ensure the images directory exists
     images_folder = "images"
     os.makedirs(images_folder, exist_ok=True)
-    
-    # Set up a requests session with retry strategy
-    session = requests.Session()
-    retries = Retry(
-        total=3,
-        backoff_factor=1,
-        status_forcelist=[500, 502, 503, 504],
-        allowed_methods=["GET"]
-    )
-    adapter = HTTPAdapter(max_retries=retries)
-    session.mount('http://', adapter)
-    session.mount('https://', adapter)
-    
-    # Define headers to mimic a browser
-    headers = {
-        'User-Agent': (
-            'Mozilla/5.0 (Windows NT 10.0; Win64; x64) '
-            'AppleWebKit/537.36 (KHTML, like Gecko) '
-            'Chrome/58.0.3029.110 Safari/537.3'
-        )
-    }
-    
-    downloaded = 0
-    idx = 0
+
+    # Images indexed by an earlier run still count, as long as their files are still there
+    index = get_image_index()
+    accepted = []
+    for phash, path in index.entries(keyword):
+        if os.path.exists(path):
+            accepted.append((phash, path))
+        else:
+            index.remove(keyword, path)
+    if len(accepted) >= num_images:
+        print(f"Already have {len(accepted)} images for {keyword}. Skipping download.")
+        return [path for _, path in accepted]
+
+    images_results = search_images(keyword)
+    if not images_results:
+        print("No image results found.")
+        return [path for _, path in accepted]
+
+    session = create_session()
+    compress_pool = get_compress_pool()
+    download_pool = ThreadPoolExecutor(max_workers=DOWNLOAD_WORKERS)
+    stop_event = threading.Event()
     total_images = len(images_results)
-    
-    while downloaded < num_images and idx < total_images:
-        image_info = images_results[idx]
-        image_url = image_info.get("original")
-        
-        if not image_url:
-            print(f"[{idx + 1}/{total_images}] No URL found for this image. Skipping.")
-            idx += 1
-            continue
-            
-        try:
-            print(f"[{idx + 1}/{total_images}] Attempting to download image: {image_url}")
-            response = session.get(image_url, headers=headers, timeout=10)
-            response.raise_for_status()
-            
-            if 'image' not in response.headers.get('Content-Type', ''):
-                print(f"[{idx + 1}/{total_images}] URL does not point to an image. Skipping.")
-                idx += 1
+
+    candidates = iter(enumerate(images_results))
+    downloads = {}
+    compressions = {}
+
+    def submit_downloads():
+        # Keep only as many images in flight (downloading or compressing) as could still be needed,
+        # plus one download per worker, and start the next candidate as each one finishes
+        window = num_images - downloaded + DOWNLOAD_WORKERS
+        while len(downloads) + len(compressions) < window:
+            idx, image_info = next(candidates, (None, None))
+            if idx is None:
+                return
+            image_url = image_info.get("original")
+            if not image_url:
+                print(f"[{idx + 1}/{total_images}] No URL found for this image. Skipping.")
                 continue
-                
-            # Compress the image to WebP
-            compressed_image = compress_image(response.content)
-            
-            # Save the compressed WebP file
-            file_path = os.path.join(
-                images_folder,
-                f"{keyword.replace(' ', '_')}_{downloaded + 1}.webp"
-            )
-            
-            with open(file_path, 'wb') as handler:
-                handler.write(compressed_image)
-                
-            file_size = os.path.getsize(file_path) / 1024  # Size in KB
-            print(f"[{idx + 1}/{total_images}] Downloaded and compressed: {file_path} ({file_size:.1f}KB)")
-            downloaded += 1
-            
-        except requests.exceptions.RequestException as req_err:
-            print(f"[{idx + 1}/{total_images}] Request error: {req_err}. Retrying...")
-        except Exception as e:
-            print(f"[{idx + 1}/{total_images}] Unexpected error: {e}. Skipping.")
-        idx += 1
-        
+            downloads[download_pool.submit(download_image, session, image_url, stop_event)] = idx
+
+    def next_file_path():
+        taken = {path for _, path in accepted}
+        number = 1
+        while True:
+            file_path = os.path.join(images_folder, f"{keyword.replace(' ', '_')}_{number}.webp")
+            if file_path not in taken:
+                return file_path
+            number += 1
+
+    downloaded = len(accepted)
+    try:
+        submit_downloads()
+        while (downloads or compressions) and downloaded < num_images:
+            done, _ = wait(set(downloads) | set(compressions), return_when=FIRST_COMPLETED)
+            for future in done:
+                if future in downloads:
+                    idx = downloads.pop(future)
+                    try:
+                        image_data = future.result()
+                    except requests.exceptions.RequestException as req_err:
+                        print(f"[{idx + 1}/{total_images}] Request error: {req_err}. Skipping.")
+                        continue
+                    except Exception as e:
+                        print(f"[{idx + 1}/{total_images}] Download failed: {e}. Skipping.")
+                        continue
+                    if image_data:
+                        known_hashes = [phash for phash, _ in accepted]
+                        compressions[compress_pool.submit(timed_hash_and_compress, image_data, known_hashes)] = idx
+                    continue
+
+                idx = compressions.pop(future)
+                try:
+                    phash, compressed_image, stats = future.result()
+                    record("compress_image", stats.pop("duration"), keyword=keyword, **stats)
+                except Exception as e:
+                    print(f"[{idx + 1}/{total_images}] Unexpected error: {e}. Skipping.")
+                    continue
+                if downloaded >= num_images:
+                    continue
+                # Re-check against images accepted while this one was being processed
+                if compressed_image is None or find_near_duplicate(phash, [known for known, _ in accepted]) is not None:
+                    print(f"[{idx + 1}/{total_images}] Near-duplicate of an already saved image. Skipping.")
+                    continue
+
+                # Save the compressed WebP file
+                file_path = next_file_path()
+                with open(file_path, 'wb') as handler:
+                    handler.write(compressed_image)
+                index.add(keyword, phash, file_path)
+                accepted.append((phash, file_path))
+
+                file_size = os.path.getsize(file_path) / 1024  # Size in KB
+                print(f"[{idx + 1}/{total_images}] Downloaded and compressed: {file_path} ({file_size:.1f}KB)")
+                downloaded += 1
+            if downloaded < num_images:
+                submit_downloads()
+    finally:
+        # Cancel outstanding work; downloads already in flight see the stop event and return nothing
+        stop_event.set()
+        for future in list(downloads) + list(compressions):
+            future.cancel()
+        download_pool.shutdown(wait=False, cancel_futures=True)
+        session.close()
+
     if downloaded < num_images:
         print(f"Downloaded {downloaded} out of {num_images} images.")
     else:
         print(f"Successfully downloaded {downloaded} images.")
+    return [path for _, path in accepted]
 
 if __name__ == "__main__":
     keyword = input("Enter a keyword to search for images: ")
@@ -1,61 +1,336 @@
-import requests
+import time
+import cache
+from backoff import async_call_with_backoff, call_with_backoff
+from instrumentation import span, record, add_to_current
 
-def fetch_wiki_page(keyword):
-    """
-    Search for a Wikipedia page by keyword and return the page title.
-    """
-    print(f"Searching for Wikipedia page with keyword: {keyword}")
-    search_url = "https://en.wikipedia.org/w/api.php"
-    search_params = {
+WIKI_API_URL = "https://en.wikipedia.org/w/api.php"
+REQUEST_TIMEOUT = 10  # seconds
+MAX_TITLES_PER_QUERY = 50  # MediaWiki limit for pipe-separated titles
+MAX_CONNECTIONS = 8
+MAX_DISAMBIGUATION_HOPS = 3
+RETRY_ATTEMPTS = 3  # per request
+HEADERS = {"User-Agent": "AnimalRanking/1.0 (ai-scraper)"}
+
+_session = None
+
+def get_session():
+    """Returns a shared requests session so sequential calls reuse the same connection."""
+    global _session
+    if _session is None:
+        import requests
+
+        _session = requests.Session()
+        _session.headers.update(HEADERS)
+    return _session
+
+def search_params(keyword):
+    return {
         "action": "query",
         "list": "search",
         "srsearch": keyword,
         "format": "json",
         "utf8": 1,
     }
-    response = requests.get(search_url, params=search_params)
-    data = response.json()
-    
+
+def extract_params(title):
+    return {
+        "action": "query",
+        "prop": "extracts|revisions",
+        "rvprop": "ids",
+        "explaintext": True,
+        "titles": title,
+        "format": "json",
+        "utf8": 1,
+    }
+
+def first_search_title(data):
     search_results = data.get("query", {}).get("search", [])
-    if not search_results:
+    return search_results[0]["title"] if search_results else None
+
+def page_record(data):
+    """The page of an extracts query as {"title", "extract", "page_id", "revision_id"}."""
+    pages = data.get("query", {}).get("pages", {})
+    page = next(iter(pages.values()), {})
+    revisions = page.get("revisions") or [{}]
+    return {
+        "title": page.get("title"),
+        "extract": page.get("extract", ""),
+        "page_id": page.get("pageid"),
+        "revision_id": revisions[0].get("revid"),
+    }
+
+def is_revision(page, revision_id):
+    """True if `page` is at `revision_id`; any revision will do when it is None."""
+    return revision_id is None or page.get("revision_id") == revision_id
+
+def disambiguation_target(extract):
+    """
+    If the extract is a disambiguation page with an Animals section,
+    returns the first animal entry in that section, otherwise None.
+    """
+    if "== Animals ==" not in extract:
+        return None
+    # Get the content right after == Animals ==
+    animal_section = extract.split("== Animals ==")[1].split("==")[0].strip()
+    # Get the first line and extract the animal name
+    return animal_section.split('\n')[0].split(',')[0].strip() or None
+
+def fetch_wiki_page(keyword):
+    """
+    Search for a Wikipedia page by keyword and return the page title.
+    """
+    print(f"Searching for Wikipedia page with keyword: {keyword}")
+    with span("fetch_wiki_page", keyword=keyword):
+        page_title = cache.cached("wikipedia:search", None, keyword, None, lambda: _search_title(keyword))
+    if not page_title:
         print(f"No Wikipedia results for keyword: {keyword}")
         return None
     # Return the title of the first search result
-    page_title = search_results[0]["title"]
     print(f"Found page title: {page_title}")
     return page_title
 
+def _get_json_sync(params):
+    def attempt():
+        response = get_session().get(WIKI_API_URL, params=params, timeout=REQUEST_TIMEOUT)
+        response.raise_for_status()
+        add_to_current("requests")
+        add_to_current("bytes", len(response.content))
+        return response.json()
+
+    return call_with_backoff(attempt, max_attempts=RETRY_ATTEMPTS, description="Wikipedia request")
+
+def _search_title(keyword):
+    return first_search_title(_get_json_sync(search_params(keyword)))
+
 def fetch_wiki_content(title):
     """
     Given a Wikipedia page title, fetch and return the content.
     If it's a disambiguation page with Animals section, fetch the first animal entry instead.
     """
-    print(f"Fetching content for Wikipedia page title: {title}")
-    page_url = "https://en.wikipedia.org/w/api.php"
-    page_params = {
-        "action": "query",
-        "prop": "extracts",
-        "explaintext": True,
-        "titles": title,
-        "format": "json",
-        "utf8": 1,
+    return fetch_wiki_article(title)["extract"]
+
+def fetch_wiki_article(title, revision_id=None):
+    """
+    Like fetch_wiki_content, but returns the page as {"title", "extract", "page_id", "revision_id"}.
+    With `revision_id`, a cached page at any other revision is fetched again.
+    """
+    with span("fetch_wiki_content", title=title):
+        return cache.cached("wikipedia:page", None, title, None, lambda: _fetch_page(title),
+                            valid=lambda page: is_revision(page, revision_id))
+
+def _fetch_page(title):
+    page = None
+    for _ in range(MAX_DISAMBIGUATION_HOPS):
+        print(f"Fetching content for Wikipedia page title: {title}")
+        page = page_record(_get_json_sync(extract_params(title)))
+
+        target = disambiguation_target(page["extract"])
+        if not target:
+            # If no Animals section, return the content as is
+            return page
+        title = target
+    return page
+
+def _query_revisions(key, values, **params):
+    """Queries only revision metadata for `values` (page IDs or titles), 50 per request, yielding (batch, query)."""
+    values = list(dict.fromkeys(values))
+    for start in range(0, len(values), MAX_TITLES_PER_QUERY):
+        batch = values[start:start + MAX_TITLES_PER_QUERY]
+        with span("fetch_revision_ids", pages=len(batch)):
+            data = _get_json_sync({
+                "action": "query",
+                "prop": "revisions",
+                "rvprop": "ids",
+                key: "|".join(str(value) for value in batch),
+                "format": "json",
+                "utf8": 1,
+                **params,
+            })
+        yield batch, data.get("query", {})
+
+def existing_revisions(query):
+    """{title: (page_id, revision_id)} of the pages in a revisions query that exist."""
+    return {
+        page["title"]: (page["pageid"], page["revisions"][0]["revid"])
+        for page in query.get("pages", {}).values()
+        if "missing" not in page and page.get("revisions")
     }
-    
-    response = requests.get(page_url, params=page_params)
-    data = response.json()
-    pages = data.get("query", {}).get("pages", {})
-    page = next(iter(pages.values()))
-    extract = page.get("extract", "")
-    
-    # Check if there's an Animals section
-    if "== Animals ==" in extract:
-        # Get the content right after == Animals ==
-        animal_section = extract.split("== Animals ==")[1].split("==")[0].strip()
-        # Get the first line and extract the animal name
-        first_animal = animal_section.split('\n')[0].split(',')[0].strip()
-        
-        # Fetch the article for this animal
-        return fetch_wiki_content(first_animal)
-    
-    # If no Animals section, return the content as is
-    return extract
+
+def resolve_title(query, title):
+    """The title `title` ends up at after the normalization and redirects reported in `query`."""
+    normalized = {item["from"]: item["to"] for item in query.get("normalized", [])}
+    redirects = {item["from"]: item["to"] for item in query.get("redirects", [])}
+    title = normalized.get(title, title)
+    return redirects.get(title, title)
+
+def fetch_revision_ids(page_ids):
+    """Latest revision ID of each page as {page_id: revision_id}. Pages that no longer exist are left out."""
+    revisions = {}
+    for _, query in _query_revisions("pageids", page_ids):
+        revisions.update(existing_revisions(query).values())
+    return revisions
+
+def fetch_revisions_by_title(titles):
+    """{title: (page_id, revision_id)} for every title that exists, following redirects."""
+    found = {}
+    for batch, query in _query_revisions("titles", titles, redirects=1):
+        pages = existing_revisions(query)
+        for title in batch:
+            resolved = resolve_title(query, title)
+            if resolved in pages:
+                found[title] = pages[resolved]
+    return found
+
+def create_async_client():
+    """
+    Creates a pooled HTTP client for the async fetchers.
+    Use it as `async with create_async_client() as client:` and share it across all calls in a batch.
+    """
+    import httpx
+
+    return httpx.AsyncClient(
+        headers=HEADERS,
+        timeout=httpx.Timeout(REQUEST_TIMEOUT, pool=None),  # queued requests wait for a free connection
+        limits=httpx.Limits(max_connections=MAX_CONNECTIONS, max_keepalive_connections=MAX_CONNECTIONS),
+    )
+
+async def _get_json(client, params):
+    """GETs the API with retries, so one transient error doesn't fail a whole batch."""
+    async def attempt():
+        # Concurrent tasks share one thread, so async requests are recorded individually rather than as nested spans
+        start = time.perf_counter()
+        response = await client.get(WIKI_API_URL, params=params)
+        response.raise_for_status()
+        record("wikipedia_request", time.perf_counter() - start,
+               action=params.get("list") or params.get("prop") or "titles", bytes=len(response.content))
+        return response.json()
+
+    return await async_call_with_backoff(attempt, max_attempts=RETRY_ATTEMPTS, description="Wikipedia request")
+
+async def fetch_wiki_page_async(client, keyword):
+    """Async variant of fetch_wiki_page."""
+    page_title = cache.lookup("wikipedia:search", None, keyword)
+    if page_title is None:
+        page_title = first_search_title(await _get_json(client, search_params(keyword)))
+        cache.store("wikipedia:search", None, keyword, None, page_title)
+    if not page_title:
+        print(f"No Wikipedia results for keyword: {keyword}")
+    return page_title
+
+async def resolve_titles_async(client, keywords):
+    """
+    Maps each keyword to a Wikipedia page title, or None when there is none. Keywords whose
+    lookups failed even after retries are left out. Keywords that already are page titles (or redirect to one) are resolved up to 50 per request
+    with a single pipe-separated titles= query; only the misses fall back to a full-text search.
+    """
+    keywords = list(dict.fromkeys(keywords))
+    titles = {}
+    for keyword in keywords:
+        title = cache.lookup("wikipedia:title", None, keyword)
+        if title is not None:
+            titles[keyword] = title
+    unresolved = [keyword for keyword in keywords if keyword not in titles]
+
+    for i in range(0, len(unresolved), MAX_TITLES_PER_QUERY):
+        batch = unresolved[i:i + MAX_TITLES_PER_QUERY]
+        try:
+            data = await _get_json(client, {
+                "action": "query",
+                "titles": "|".join(batch),
+                "redirects": 1,
+                "format": "json",
+                "utf8": 1,
+            })
+        except Exception as e:
+            # The batch falls through to the per-keyword searches below
+            print(f"Resolving {len(batch)} titles failed: {e}")
+            continue
+        query = data.get("query", {})
+        existing = {
+            page["title"] for page in query.get("pages", {}).values()
+            if "missing" not in page and "invalid" not in page
+        }
+        for keyword in batch:
+            title = resolve_title(query, keyword)
+            if title in existing:
+                titles[keyword] = title
+                cache.store("wikipedia:title", None, keyword, None, title)
+
+    misses = [keyword for keyword in keywords if keyword not in titles]
+    if misses:
+        import asyncio
+
+        print(f"Searching Wikipedia for {len(misses)} keywords without an exact page")
+        found = await asyncio.gather(*(fetch_wiki_page_async(client, keyword) for keyword in misses),
+                                     return_exceptions=True)
+        for keyword, title in zip(misses, found):
+            if isinstance(title, Exception):
+                print(f"Wikipedia search for {keyword} failed: {title}")
+            else:
+                titles[keyword] = title
+    return titles
+
+async def fetch_wiki_article_async(client, title, revision_id=None):
+    """Async variant of fetch_wiki_article."""
+    page = cache.lookup("wikipedia:page", None, title)
+    if page is None or not is_revision(page, revision_id):
+        page = await _fetch_page_async(client, title)
+        cache.store("wikipedia:page", None, title, None, page)
+    return page
+
+async def _fetch_page_async(client, title):
+    page = None
+    for _ in range(MAX_DISAMBIGUATION_HOPS):
+        page = page_record(await _get_json(client, extract_params(title)))
+        target = disambiguation_target(page["extract"])
+        if not target:
+            return page
+        title = target
+    return page
+
+async def fetch_wiki_articles_async(client, keywords, revisions=None):
+    """
+    Returns {keyword: page}, where page is {"title", "extract", "page_id", "revision_id"}, or None
+    when nothing was found. `revisions` maps keywords to the revision their page must be at.
+    Keywords whose requests failed even after retries are left out, for the caller to fetch on its own.
+    """
+    import asyncio
+
+    revisions = revisions or {}
+    titles = await resolve_titles_async(client, keywords)
+    expected = {title: revisions.get(keyword) for keyword, title in titles.items() if title}
+    # TextExtracts only returns one full (non-intro) extract per request, so these go out concurrently instead
+    pages = await asyncio.gather(*(fetch_wiki_article_async(client, title, expected[title]) for title in expected),
+                                 return_exceptions=True)
+    page_by_title = {}
+    for title, page in zip(expected, pages):
+        if isinstance(page, Exception):
+            print(f"Fetching Wikipedia page {title} failed: {page}")
+        else:
+            page_by_title[title] = page
+    return {
+        keyword: page_by_title.get(title) for keyword, title in titles.items()
+        if title is None or title in page_by_title
+    }
+
+def fetch_wiki_articles(keywords, revisions=None):
+    """Resolves and fetches many animals at once over one pooled client."""
+    # asyncio is imported lazily, like the HTTP clients, to keep importing this module cheap
+    import asyncio
+
+    async def run():
+        async with create_async_client() as client:
+            return await fetch_wiki_articles_async(client, keywords, revisions)
+
+    print(f"Fetching Wikipedia articles for {len(keywords)} keywords")
+    return asyncio.run(run())
+
+def resolve_titles(keywords):
+    """Maps each keyword to a Wikipedia page title (or None) over one pooled client, 50 titles per request."""
+    import asyncio
+
+    async def run():
+        async with create_async_client() as client:
+            return await resolve_titles_async(client, keywords)
+
+    return asyncio.run(run())
@@ -0,0 +1,154 @@
+import json
+import os
+from functools import lru_cache
+import dotenv
+import cache
+from backoff import call_with_backoff
+from instrumentation import span, current_span
+from prompt_context import estimate_tokens
+from scheduler import Scheduler
+
+dotenv.load_dotenv()
+
+API_KEY = os.getenv("GEMINI_API_KEY")
+MODEL_NAME = "gemini-2.0-flash-exp"
+# Quota shared by every Gemini call in the process; 0 disables a limit
+REQUESTS_PER_MINUTE = int(os.getenv("GEMINI_REQUESTS_PER_MINUTE", 10))
+TOKENS_PER_MINUTE = int(os.getenv("GEMINI_TOKENS_PER_MINUTE", 4_000_000))
+EXPECTED_OUTPUT_TOKENS = 1000  # charged up front per request, corrected once the usage is known
+
+# Lower goes first: translations finish animals whose articles are already paid for
+PRIORITY_TRANSLATION = 0
+PRIORITY_ARTICLE = 1
+
+@lru_cache(maxsize=None)
+def get_model():
+    """
+    Configures genai and builds the model once; the client is reused by every request.
+    The SDK is imported here rather than at module level so importing this module stays cheap.
+    """
+    if not API_KEY:
+        raise ValueError("Please set GEMINI_API_KEY in .env file")
+    import google.generativeai as genai
+
+    genai.configure(api_key=API_KEY)
+    return genai.GenerativeModel(MODEL_NAME)
+
+@lru_cache(maxsize=None)
+def get_scheduler():
+    """The rate-limit scheduler every Gemini request goes through."""
+    return Scheduler(REQUESTS_PER_MINUTE, TOKENS_PER_MINUTE)
+
+def response_text(response):
+    return response.candidates[0].content.parts[0].text
+
+def record_usage(response):
+    """Adds the token counts Gemini reports for a response to the current span and returns the total, if known."""
+    usage = getattr(response, "usage_metadata", None)
+    if usage is None:
+        return None
+    total = getattr(usage, "total_token_count", 0) or 0
+    current = current_span()
+    if current is not None:
+        current.add("prompt_tokens", getattr(usage, "prompt_token_count", 0) or 0)
+        current.add("output_tokens", getattr(usage, "candidates_token_count", 0) or 0)
+        current.add("total_tokens", total)
+    return total
+
+def estimate_request_tokens(prompt):
+    return estimate_tokens(prompt) + EXPECTED_OUTPUT_TOKENS
+
+def _generate_content(model, prompt, priority, **kwargs):
+    with get_scheduler().slot(estimate_request_tokens(prompt), priority) as grant:
+        response = model.generate_content(prompt, **kwargs)
+        grant.tokens = record_usage(response)
+    return response
+
+def scheduled(endpoint, prompt, params, generate):
+    """
+    Serves a request from the cache, or generates it; concurrent identical requests share one
+    generation instead of each spending quota on it.
+    """
+    return get_scheduler().coalesce(
+        cache.make_key(endpoint, MODEL_NAME, prompt, params),
+        lambda: cache.cached(endpoint, MODEL_NAME, prompt, params, generate),
+    )
+
+def chunk_text(chunk):
+    """Text of one streamed response chunk; chunks that only carry metadata yield an empty string."""
+    if not chunk.candidates or not chunk.candidates[0].content.parts:
+        return ""
+    return "".join(part.text for part in chunk.candidates[0].content.parts)
+
+def generate_text(prompt, description="Gemini request", priority=PRIORITY_ARTICLE):
+    """Generates plain text for `prompt`, going through the cache and the scheduler, retrying with backoff."""
+    def generate():
+        model = get_model()
+        return call_with_backoff(
+            lambda: response_text(_generate_content(model, prompt, priority)), description=description
+        )
+
+    with span("generate_content", model=MODEL_NAME, request=description, prompt_chars=len(prompt)):
+        return scheduled("gemini:generate_content", prompt, None, generate)
+
+def parse_json_object(text, required_keys=()):
+    data = json.loads(text)
+    missing = [key for key in required_keys if not isinstance(data, dict) or key not in data]
+    if missing:
+        raise ValueError(f"Response is missing fields: {', '.join(missing)}")
+    return data
+
+def generate_json(prompt, required_keys=(), description="Gemini request", priority=PRIORITY_ARTICLE):
+    """
+    Generates a JSON object for `prompt` and returns it parsed.
+    Malformed JSON or missing `required_keys` count as a failed attempt and are retried.
+    """
+    generation_config = {"response_mime_type": "application/json"}
+
+    def generate():
+        model = get_model()
+        return call_with_backoff(
+            lambda: parse_json_object(
+                response_text(_generate_content(model, prompt, priority, generation_config=generation_config)),
+                required_keys,
+            ),
+            description=description,
+        )
+
+    with span("generate_content", model=MODEL_NAME, request=description, prompt_chars=len(prompt)):
+        return scheduled("gemini:generate_content", prompt, generation_config, generate)
+
+def stream_text(prompt, resume_prompt=None, description="Gemini request", priority=PRIORITY_ARTICLE):
+    """
+    Generates plain text for `prompt` from a streaming response.
+    Text received before a mid-stream failure is kept: when `resume_prompt(partial)` is given,
+    the retry asks the model to continue from the partial text instead of starting over.
+    """
+    def generate():
+        model = get_model()
+        received = []
+
+        def attempt():
+            partial = "".join(received)
+            if partial and resume_prompt:
+                print(f"{description}: resuming after {len(partial)} received characters")
+                request = resume_prompt(partial)
+            else:
+                received.clear()
+                request = prompt
+            last_chunk = None
+            with get_scheduler().slot(estimate_request_tokens(request), priority) as grant:
+                try:
+                    for chunk in model.generate_content(request, stream=True):
+                        received.append(chunk_text(chunk))
+                        last_chunk = chunk
+                finally:
+                    # The final chunk carries the usage of the whole (possibly interrupted) response
+                    if last_chunk is not None:
+                        grant.tokens = record_usage(last_chunk)
+            return "".join(received)
+
+        return call_with_backoff(attempt, description=description)
+
+    with span("generate_content", model=MODEL_NAME, request=description, prompt_chars=len(prompt), stream=True):
+        return scheduled("gemini:stream_generate_content", prompt, None, generate)
@@ -0,0 +1,72 @@
+import os
+import time
+from functools import lru_cache
+from PIL import Image
+from local_store import DATA_DIR, SQLiteStore
+
+MAX_HASH_DISTANCE = int(os.getenv("IMAGE_MAX_HASH_DISTANCE", 10))  # out of 64 bits
+HASH_SIZE = 8
+
+def dhash(img, hash_size=HASH_SIZE):
+    """
+    Difference hash: compares neighbouring pixels of a tiny grayscale thumbnail.
+    Resized, recompressed or slightly recoloured copies of a photo hash to nearby values.
+    """
+    small = img.convert("L").resize((hash_size + 1, hash_size), Image.LANCZOS)
+    pixels = list(small.getdata())
+    value = 0
+    for row in range(hash_size):
+        for col in range(hash_size):
+            left = pixels[row * (hash_size + 1) + col]
+            right = pixels[row * (hash_size + 1) + col + 1]
+            value = (value << 1) | (left > right)
+    return value
+
+def hamming_distance(a, b):
+    return bin(a ^ b).count("1")
+
+def find_near_duplicate(phash, known_hashes, max_distance=MAX_HASH_DISTANCE):
+    """Returns the first known hash within `max_distance` of `phash`, or None."""
+    for known in known_hashes:
+        if hamming_distance(phash, known) <= max_distance:
+            return known
+    return None
+
+class ImageIndex(SQLiteStore):
+    """Local SQLite index of the perceptual hashes of every saved image, keyed per animal."""
+
+    def __init__(self, path):
+        super().__init__(path)
+        # Hashes are stored as hex text because SQLite integers are signed 64-bit
+        self._conn.execute("""
+            CREATE TABLE IF NOT EXISTS image_hashes (
+                animal TEXT NOT NULL,
+                phash TEXT NOT NULL,
+                path TEXT NOT NULL,
+                created_at REAL NOT NULL,
+                PRIMARY KEY (animal, path)
+            )
+        """)
+
+    def entries(self, animal):
+        """Returns [(phash, path)] for the animal's indexed images."""
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT phash, path FROM image_hashes WHERE animal = ? ORDER BY created_at", (animal,)
+            ).fetchall()
+        return [(int(phash, 16), path) for phash, path in rows]
+
+    def add(self, animal, phash, path):
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO image_hashes (animal, phash, path, created_at) VALUES (?, ?, ?, ?)",
+                (animal, format(phash, "016x"), path, time.time()),
+            )
+
+    def remove(self, animal, path):
+        with self._lock:
+            self._conn.execute("DELETE FROM image_hashes WHERE animal = ? AND path = ?", (animal, path))
+
+@lru_cache(maxsize=None)
+def get_image_index():
+    return ImageIndex(os.path.join(DATA_DIR, "image_index.sqlite3"))
@@ -1,14 +1,261 @@
+import argparse
+import os
+import time
 import db_service
 import random_animal
-from translation import Translation
+import catalog
+import instrumentation
+from animal import Animal
+from checkpoint import checkpointed, get_checkpoints
+from translation import Translation, translate_all
 from fetch_animal_images import download_images_serpapi
+from fetch_wiki_page import fetch_wiki_articles, fetch_revision_ids, fetch_revisions_by_title, resolve_titles
+from instrumentation import span
+from pipeline import Stage, run_pipeline, print_report
 
-def main():
-    animal = random_animal.get_random_animal()
-    polish_translation = Translation(animal, "pl").translate()
-    download_images_serpapi(animal.name)
+LANGUAGES = ["pl"]
 
-    db_service.add_animal_transactionally(animal, [polish_translation])
+DEFAULT_CONCURRENCY = {
+    "generate": 2,
+    "translate": 2,
+    "images": 4,
+    "upload": 2,
+}
+
+class AnimalJob:
+    """Carries one animal through the batch pipeline stages."""
+
+    def __init__(self, name, languages=LANGUAGES):
+        self.name = name
+        self.languages = languages
+        self.wiki_page = None
+        self.wiki_revision_id = None  # the revision the article must be generated from, when refreshing
+        self.animal = None
+        self.translations = []
+        self.image_paths = []
+        self.image_urls = []
+        self.result = None
+
+    def __str__(self):
+        return self.name
+
+# Every stage checkpoints its output, so a job that failed earlier resumes after its last completed stage
+
+def generate_stage(job):
+    with span("stage", stage="article", animal=job.name):
+        job.animal = checkpointed(
+            job.name, "article",
+            lambda: random_animal.get_animal(job.name, job.wiki_page, job.wiki_revision_id),
+            dump=Animal.to_dict, load=Animal.from_dict,
+            valid=lambda animal: job.wiki_revision_id in (None, animal.wiki_revision_id),
+        )
+    return job
+
+def translate_stage(job):
+    with span("stage", stage="translations", animal=job.name):
+        job.translations = checkpointed(
+            job.name, "translations",
+            lambda: translate_all(job.animal, job.languages),
+            dump=lambda translations: [t.to_dict() for t in translations],
+            load=lambda data: [Translation.from_dict(t) for t in data],
+            valid=lambda translations: [t.language for t in translations] == list(job.languages),
+        )
+    return job
+
+def images_stage(job):
+    with span("stage", stage="images", animal=job.name):
+        job.image_paths = checkpointed(
+            job.name, "images",
+            lambda: download_images_serpapi(job.animal.name),
+            valid=lambda paths: all(os.path.exists(path) for path in paths),
+        )
+    return job
+
+def upload_stage(job):
+    with span("stage", stage="uploaded", animal=job.name):
+        job.image_urls = checkpointed(job.name, "uploaded", lambda: db_service.upload_animal_images(job.animal, job.image_paths))
+    return job
+
+def resumable_animals():
+    """
+    Animals with checkpoints from an earlier failed run that aren't in the database yet.
+    Animals that failed within RETRY_FAILED_AFTER are left out, so one that fails on every
+    attempt doesn't stay first in line for good.
+    """
+    animal_catalog = catalog.get_catalog()
+    skipped = set(animal_catalog.names(catalog.DONE)) | animal_catalog.recently_failed()
+    return [name for name in get_checkpoints().animals() if name not in skipped]
+
+def mark_done(animal):
+    catalog.get_catalog().mark_done(animal.name, animal.wiki_title, animal.wiki_page_id, animal.wiki_revision_id)
+    get_checkpoints().clear(animal.name)
+
+def batch_main(animal_names, concurrency=None, languages=LANGUAGES, revisions=None, keep_images=False):
+    """
+    Ingests many animals at once, overlapping the Wikipedia/Gemini, translation, image and upload stages.
+    Animals that make it through the pipeline are then written with batched bulk RPCs.
+    `revisions` maps animal names to the Wikipedia revision their article has to be generated from.
+    With `keep_images`, only the article and translations are generated and the animals keep
+    the image URLs stored in the database.
+    """
+    revisions = revisions or {}
+    concurrency = {**DEFAULT_CONCURRENCY, **(concurrency or {})}
+    stages = [
+        Stage("generate", generate_stage, concurrency["generate"]),
+        Stage("translate", translate_stage, concurrency["translate"]),
+    ]
+    if not keep_images:
+        stages += [
+            Stage("images", images_stage, concurrency["images"]),
+            Stage("upload", upload_stage, concurrency["upload"]),
+        ]
+
+    print(f"Starting batch of {len(animal_names)} animals")
+    start = time.perf_counter()
+
+    # Resolve every Wikipedia article up front in batched requests over one pooled client
+    jobs = [AnimalJob(name, languages) for name in animal_names]
+    to_fetch = [name for name in animal_names if "article" not in get_checkpoints().completed_stages(name)]
+    try:
+        articles = fetch_wiki_articles(to_fetch, revisions) if to_fetch else {}
+    except Exception as e:
+        print(f"Batched Wikipedia fetch failed, falling back to per-animal requests: {e}")
+        articles = {}
+    for job in jobs:
+        job.wiki_page = articles.get(job.name)
+        job.wiki_revision_id = revisions.get(job.name)
+
+    results = run_pipeline(jobs, stages)
+
+    completed = [job for job, error in results if error is None]
+    if keep_images:
+        stored = db_service.get_image_urls([job.animal.name for job in completed])
+        for job in completed:
+            job.image_urls = stored.get(job.animal.name, [])
+    statuses = db_service.add_animals_bulk([(job.animal, job.translations, job.image_urls) for job in completed])
+    for job, status in zip(completed, statuses):
+        job.result = status
+    results = [
+        (job, RuntimeError(job.result["error"]) if error is None and job.result["status"] != "ok" else error)
+        for job, error in results
+    ]
+
+    print_report(stages, results, time.perf_counter() - start)
+    for job, error in results:
+        if error is not None:
+            print(f"Failed: {job.name} ({error})")
+            catalog.get_catalog().mark_failed(job.name, error)
+        else:
+            mark_done(job.animal)
+    return results
+
+def refresh_main(concurrency=None, languages=LANGUAGES):
+    """
+    Regenerates the articles and translations of stored animals whose Wikipedia page changed since
+    they were generated. Changes are found by querying only revision IDs, 50 pages per request.
+    """
+    animal_catalog = catalog.get_catalog()
+    known = animal_catalog.wiki_revisions()
+
+    # Animals generated before revisions were tracked: their current revision becomes the baseline.
+    # Those that were only synced from the database have no title yet, so theirs is resolved first.
+    untracked = [(name, title) for name, title, page_id, _ in known if page_id is None]
+    untitled = [name for name, title in untracked if not title]
+    if untitled:
+        titles = resolve_titles(untitled)
+        untracked = [(name, title or titles.get(name)) for name, title in untracked]
+    found = fetch_revisions_by_title([title for _, title in untracked if title]) if untracked else {}
+    baselined = 0
+    for name, title in untracked:
+        if title in found:
+            animal_catalog.set_revision(name, *found[title], wiki_title=title)
+            baselined += 1
+    if untracked:
+        print(f"Recorded the current Wikipedia revision of {baselined} animals generated before revisions were tracked")
+    missing = [name for name, title in untracked if title not in found]
+    if missing:
+        print(f"No Wikipedia page found for {len(missing)} animals, they won't be refreshed: {', '.join(missing)}")
+
+    tracked = [(name, page_id, revision_id) for name, _, page_id, revision_id in known if page_id is not None]
+    current = fetch_revision_ids([page_id for _, page_id, _ in tracked])
+    changed = {
+        name: current[page_id] for name, page_id, revision_id in tracked
+        if page_id in current and current[page_id] != revision_id
+    }
+    print(f"{len(changed)} of {len(tracked)} tracked animals have a newer Wikipedia revision")
+    if not changed:
+        return []
+    # Images don't depend on the article, so the stored ones are kept rather than searched for again
+    return batch_main(list(changed), concurrency, languages, revisions=changed, keep_images=True)
+
+def parse_concurrency(value):
+    """Parses 'generate=2,images=8' into a dict of per-stage worker counts."""
+    concurrency = {}
+    for part in value.split(","):
+        stage, _, workers = part.partition("=")
+        if stage not in DEFAULT_CONCURRENCY or not workers.isdigit():
+            raise argparse.ArgumentTypeError(f"Invalid stage concurrency: {part}")
+        concurrency[stage] = int(workers)
+    return concurrency
+
+def parse_batch(value):
+    """Parses the --batch size: a positive number of animals, or 'all'."""
+    if value == "all":
+        return value
+    if not value.isdigit() or int(value) == 0:
+        raise argparse.ArgumentTypeError(f"Invalid batch size: {value} (expected a positive number or 'all')")
+    return int(value)
+
+def main(languages=LANGUAGES, resume=False):
+    """Ingests one animal. With `resume`, an animal left unfinished by an earlier run goes first."""
+    catalog.sync_with_database()
+    resumable = resumable_animals() if resume else []
+    animal_name = resumable[0] if resumable else random_animal.get_random_animal_name()
+
+    job = AnimalJob(animal_name, languages)
+    try:
+        for stage in (generate_stage, translate_stage, images_stage, upload_stage):
+            stage(job)
+        job.result = db_service.add_animal_transactionally(job.animal, job.translations, job.image_urls)
+    except Exception as e:
+        catalog.get_catalog().mark_failed(animal_name, e)
+        raise
+    mark_done(job.animal)
 
 if __name__ == "__main__":
-    main()
\ No newline at end of file
+    parser = argparse.ArgumentParser(description="Generate animal articles and store them in Supabase.")
+    parser.add_argument("--batch", type=parse_batch, metavar="N",
+                        help="ingest N random pending animals (or 'all') concurrently instead of one")
+    parser.add_argument("--animals", nargs="+", metavar="NAME",
+                        help="ingest the given animals concurrently")
+    parser.add_argument("--concurrency", type=parse_concurrency, default={},
+                        help="workers per stage, e.g. generate=2,translate=2,images=4,upload=2")
+    parser.add_argument("--resume", action="store_true",
+                        help="finish animals left unfinished by earlier runs first, reusing their completed stages")
+    parser.add_argument("--refresh", action="store_true",
+                        help="regenerate stored animals whose Wikipedia page has a newer revision")
+    parser.add_argument("--languages", nargs="+", default=LANGUAGES, metavar="CODE",
+                        help="languages to translate into (default: %(default)s)")
+    parser.add_argument("--report", metavar="PATH",
+                        help="where to write the JSON-lines timing/cost report (default: .scraper/reports/)")
+    args = parser.parse_args()
+
+    try:
+        if args.refresh:
+            catalog.sync_with_database()
+            refresh_main(args.concurrency, args.languages)
+        elif args.animals:
+            batch_main(args.animals, args.concurrency, args.languages)
+        elif args.batch:
+            catalog.sync_with_database()
+            animal_catalog = catalog.get_catalog()
+            names = resumable_animals() if args.resume else []
+            count = animal_catalog.pending_count() if args.batch == "all" else max(0, args.batch - len(names))
+            names = list(dict.fromkeys(names + animal_catalog.sample_pending(count)))
+            batch_main(names, args.concurrency, args.languages)
+        else:
+            main(args.languages, args.resume)
+    finally:
+        # Failed runs are the ones worth looking at, so the report is written either way
+        instrumentation.print_summary()
+        instrumentation.write_report(args.report)
@@ -0,0 +1,113 @@
+import json
+import os
+import threading
+import time
+from contextlib import contextmanager
+from local_store import DATA_DIR
+
+REPORT_DIR = os.path.join(DATA_DIR, "reports")
+RUN_ID = time.strftime("%Y%m%d-%H%M%S")
+
+_records = []
+_records_lock = threading.Lock()
+_local = threading.local()
+
+class Span:
+    """Attributes collected while a span is open; numeric counters are summed with `add`."""
+
+    def __init__(self, name, attrs):
+        self.name = name
+        self.attrs = dict(attrs)
+
+    def set(self, **attrs):
+        self.attrs.update(attrs)
+
+    def add(self, key, amount=1):
+        self.attrs[key] = self.attrs.get(key, 0) + amount
+
+def _stack():
+    if not hasattr(_local, "stack"):
+        _local.stack = []
+    return _local.stack
+
+@contextmanager
+def span(name, **attrs):
+    """
+    Times the enclosed block and records it with its attributes.
+    Spans nest per thread; code running inside one can reach it through `current_span()`.
+    """
+    current = Span(name, attrs)
+    stack = _stack()
+    parent = stack[-1].name if stack else None
+    stack.append(current)
+    started_at = time.time()
+    start = time.perf_counter()
+    error = None
+    try:
+        yield current
+    except Exception as e:
+        error = repr(e)
+        raise
+    finally:
+        stack.pop()
+        record(name, time.perf_counter() - start, started_at=started_at, parent=parent, error=error, **current.attrs)
+
+def current_span():
+    stack = _stack()
+    return stack[-1] if stack else None
+
+def add_to_current(key, amount=1):
+    """Adds to a counter on the innermost open span of this thread, if there is one."""
+    current = current_span()
+    if current is not None:
+        current.add(key, amount)
+
+def record(name, duration, **attrs):
+    """Records a finished operation, e.g. one timed in another process or an async task."""
+    entry = {
+        "run_id": RUN_ID,
+        "span": name,
+        "duration_s": round(duration, 6),
+        "thread": threading.current_thread().name,
+        "started_at": attrs.pop("started_at", time.time() - duration),
+    }
+    entry.update({key: value for key, value in attrs.items() if value is not None})
+    with _records_lock:
+        _records.append(entry)
+
+def records():
+    with _records_lock:
+        return list(_records)
+
+def summarize(entries=None):
+    """Per-span totals: count, errors, duration and the summed numeric attributes."""
+    summary = {}
+    for entry in records() if entries is None else entries:
+        totals = summary.setdefault(entry["span"], {"count": 0, "errors": 0, "duration_s": 0.0})
+        totals["count"] += 1
+        totals["errors"] += 1 if entry.get("error") else 0
+        totals["duration_s"] += entry["duration_s"]
+        for key, value in entry.items():
+            if key in ("duration_s", "started_at") or isinstance(value, bool) or not isinstance(value, (int, float)):
+                continue
+            totals[key] = totals.get(key, 0) + value
+    return summary
+
+def print_summary():
+    print("\nTime and quota by span:")
+    for name, totals in sorted(summarize().items(), key=lambda item: -item[1]["duration_s"]):
+        extras = ", ".join(
+            f"{key}={value}" for key, value in totals.items() if key not in ("count", "errors", "duration_s")
+        )
+        print(f"  {name:<22} count={totals['count']:<5} errors={totals['errors']:<3} "
+              f"total={totals['duration_s']:8.2f}s {extras}")
+
+def write_report(path=None):
+    """Writes every record of this run as JSON lines and returns the file path."""
+    path = path or os.path.join(REPORT_DIR, f"run-{RUN_ID}.jsonl")
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+    with open(path, "w") as f:
+        for entry in records():
+            f.write(json.dumps(entry, ensure_ascii=False) + "\n")
+    print(f"Instrumentation report written to {path}")
+    return path
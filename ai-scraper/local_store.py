@@ -0,0 +1,24 @@
+import os
+import sqlite3
+import threading
+
+# Every piece of local state (catalog, checkpoints, caches, image index, reports) lives here
+DATA_DIR = os.getenv("SCRAPER_DATA_DIR", ".scraper")
+
+def open_store(path):
+    """
+    Opens (creating its directory if needed) a SQLite database shared by all threads.
+    Autocommit mode, so writers take explicit BEGIN/COMMIT only where they need a transaction;
+    WAL, so readers don't wait for writers.
+    """
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+    connection = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+    connection.execute("PRAGMA journal_mode=WAL")
+    return connection
+
+class SQLiteStore:
+    """Base of the local stores: one connection from open_store(), with every use serialized by `_lock`."""
+
+    def __init__(self, path):
+        self._lock = threading.Lock()
+        self._conn = open_store(path)
@@ -0,0 +1,112 @@
+import queue
+import threading
+import time
+
+_DONE = object()
+
+
+class Stage:
+    """A named pipeline step that runs `func` on a bounded pool of worker threads."""
+
+    def __init__(self, name, func, workers=1):
+        self.name = name
+        self.func = func
+        self.workers = max(1, workers)
+        self.processed = 0
+        self.failed = 0
+        self.busy_time = 0.0
+        self.started_at = None
+        self.finished_at = None
+        self._lock = threading.Lock()
+
+    def record(self, start, end, ok):
+        with self._lock:
+            if ok:
+                self.processed += 1
+            else:
+                self.failed += 1
+            self.busy_time += end - start
+            if self.started_at is None or start < self.started_at:
+                self.started_at = start
+            if self.finished_at is None or end > self.finished_at:
+                self.finished_at = end
+
+    def throughput(self):
+        """Items per minute over the stage's wall-clock window."""
+        if self.started_at is None or not self.processed:
+            return 0.0
+        wall = max(self.finished_at - self.started_at, 1e-9)
+        return self.processed / wall * 60
+
+    def __str__(self):
+        handled = self.processed + self.failed
+        avg = self.busy_time / handled if handled else 0.0
+        return (
+            f"{self.name:<10} workers={self.workers:<3} ok={self.processed:<4} failed={self.failed:<4} "
+            f"avg={avg:6.2f}s busy={self.busy_time:8.2f}s throughput={self.throughput():6.2f}/min"
+        )
+
+
+def run_pipeline(items, stages):
+    """
+    Pushes every item through `stages` in order. Each stage has its own worker pool and
+    input queue, so different items overlap across stages.
+    Returns a list of (item, error) tuples; error is None for items that passed every stage.
+    """
+    queues = [queue.Queue() for _ in stages]
+    results = []
+    results_lock = threading.Lock()
+
+    def worker(index):
+        stage = stages[index]
+        while True:
+            item = queues[index].get()
+            if item is _DONE:
+                return
+            start = time.perf_counter()
+            try:
+                output = stage.func(item)
+            except Exception as e:
+                stage.record(start, time.perf_counter(), ok=False)
+                print(f"[{stage.name}] Failed for {item}: {e}")
+                with results_lock:
+                    results.append((item, e))
+                continue
+            stage.record(start, time.perf_counter(), ok=True)
+            if index + 1 < len(stages):
+                queues[index + 1].put(output)
+            else:
+                with results_lock:
+                    results.append((output, None))
+
+    threads = []
+    for index, stage in enumerate(stages):
+        stage_threads = [
+            threading.Thread(target=worker, args=(index,), name=f"{stage.name}-{n}", daemon=True)
+            for n in range(stage.workers)
+        ]
+        for thread in stage_threads:
+            thread.start()
+        threads.append(stage_threads)
+
+    for item in items:
+        queues[0].put(item)
+
+    # Shut stages down front to back so every item reaches the next queue before its sentinel
+    for index, stage in enumerate(stages):
+        for _ in range(stage.workers):
+            queues[index].put(_DONE)
+        for thread in threads[index]:
+            thread.join()
+
+    return results
+
+
+def print_report(stages, results, elapsed):
+    failed = sum(1 for _, error in results if error is not None)
+    succeeded = len(results) - failed
+    print(f"\nPipeline finished in {elapsed:.1f}s: {succeeded} succeeded, {failed} failed")
+    if succeeded:
+        print(f"End-to-end throughput: {succeeded / elapsed * 60:.2f} animals/min")
+    for stage in stages:
+        print(stage)
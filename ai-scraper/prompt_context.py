@@ -0,0 +1,140 @@
+"""
+Prompt context builder.
+
+Picks the parts of a Wikipedia extract that matter for one prompt and fits them into a token
+budget, instead of pasting the whole extract into every prompt. Token counts are estimated from
+character counts (about 4 characters per token for English text), which is close enough for
+budgeting and needs no API call.
+"""
+import math
+import os
+import re
+from instrumentation import span
+
+ARTICLE_CONTEXT_TOKENS = int(os.getenv("ARTICLE_CONTEXT_TOKENS", 2000))  # per article prompt
+SUMMARY_TOKENS = int(os.getenv("SUMMARY_CONTEXT_TOKENS", 80))  # context for name translations
+CHARS_PER_TOKEN = 4
+MIN_PARTIAL_TOKENS = 100  # don't bother trimming a section down to less than this
+
+# Wikipedia plain-text extracts mark sections with "== Heading ==" lines (more = for subsections)
+SECTION_HEADING = re.compile(r"^(={2,})\s*(.+?)\s*\1\s*$", re.MULTILINE)
+SKIPPED_SECTIONS = {
+    "see also", "references", "external links", "further reading", "notes", "bibliography",
+    "sources", "gallery", "citations", "footnotes",
+}
+WORD = re.compile(r"[a-z]+")
+STEM_LENGTH = 5  # words are compared by prefix, a crude but dependency-free stemmer
+STOPWORDS = {
+    "about", "animal", "animals", "other", "their", "these", "there", "which", "while", "would",
+    "include", "mention", "describe", "detail", "explain", "discuss", "compare", "highlight",
+}
+SENTENCE_END = re.compile(r"(?<=[.!?])\s+")
+
+def estimate_tokens(text):
+    return math.ceil(len(text) / CHARS_PER_TOKEN)
+
+def terms(text):
+    """The stems of the meaningful words in `text`."""
+    return [word[:STEM_LENGTH] for word in WORD.findall(text.lower()) if len(word) >= STEM_LENGTH and word not in STOPWORDS]
+
+def split_sections(extract):
+    """Splits a plain-text extract into (heading, text) pairs; the lead section has an empty heading."""
+    sections = []
+    heading, start = "", 0
+    for match in SECTION_HEADING.finditer(extract):
+        sections.append((heading, extract[start:match.start()].strip()))
+        heading, start = match.group(2), match.end()
+    sections.append((heading, extract[start:].strip()))
+    return [(heading, text) for heading, text in sections if text and heading.lower() not in SKIPPED_SECTIONS]
+
+def relevance(heading, text, focus_terms):
+    """How much of a section is about the focus: matching words, normalized for length, with headings counting triple."""
+    words = terms(text)
+    if not words:
+        return 0.0
+    body = sum(1 for word in words if word in focus_terms) / math.sqrt(len(words))
+    return body + 3 * sum(1 for word in terms(heading) if word in focus_terms)
+
+def trim_to_tokens(text, budget):
+    """Cuts `text` to at most `budget` tokens, at a paragraph or else a sentence boundary when possible."""
+    limit = budget * CHARS_PER_TOKEN
+    if len(text) <= limit:
+        return text
+    cut = text[:limit]
+    for boundary in ("\n", ". "):
+        end = cut.rfind(boundary)
+        if end > limit // 2:
+            return cut[:end + 1].strip()
+    return cut.strip()
+
+def format_section(heading, text):
+    return f"== {heading} ==\n{text}" if heading else text
+
+def select_context(extract, focus, budget=ARTICLE_CONTEXT_TOKENS):
+    """
+    Returns the parts of `extract` most relevant to `focus` (e.g. the category list of a prompt)
+    that fit within `budget` tokens, in their original order. The lead section always comes first,
+    since it identifies the animal.
+    """
+    if not extract or estimate_tokens(extract) <= budget:
+        return extract or ""
+    sections = split_sections(extract)
+    if not sections:
+        return trim_to_tokens(extract, budget)
+
+    focus_terms = set(terms(focus))
+    chosen = {}
+    remaining = budget
+    lead_heading, lead = sections[0]
+    if not lead_heading:
+        # The lead gets a third of the budget when there are other sections to fill the rest
+        chosen[0] = trim_to_tokens(lead, budget // 3 if len(sections) > 1 else budget)
+        remaining -= estimate_tokens(format_section("", chosen[0]))
+
+    ranked = sorted(
+        (index for index in range(len(sections)) if index not in chosen),
+        key=lambda index: relevance(*sections[index], focus_terms),
+        reverse=True,
+    )
+    for index in ranked:
+        heading, text = sections[index]
+        cost = estimate_tokens(format_section(heading, text))
+        if cost <= remaining:
+            chosen[index] = text
+            remaining -= cost
+        elif remaining >= MIN_PARTIAL_TOKENS:
+            chosen[index] = trim_to_tokens(text, remaining - estimate_tokens(format_section(heading, "")))
+            remaining = 0
+        if remaining < MIN_PARTIAL_TOKENS:
+            break
+
+    return "\n\n".join(format_section(sections[index][0], chosen[index]) for index in sorted(chosen))
+
+def summarize(text, budget=SUMMARY_TOKENS):
+    """The opening sentences of `text`, up to `budget` tokens, without markdown bold markers."""
+    plain = re.sub(r"\*\*[^*\n]+\*\*\s*", "", text).strip()
+    summary = ""
+    for sentence in SENTENCE_END.split(plain):
+        candidate = f"{summary} {sentence}".strip()
+        if estimate_tokens(candidate) > budget:
+            break
+        summary = candidate
+    return summary or trim_to_tokens(plain, budget)
+
+def build_context(source, focus=None, budget=None, request="Prompt"):
+    """
+    Context for one prompt: the sections of `source` relevant to `focus` within `budget` tokens
+    (ARTICLE_CONTEXT_TOKENS by default), or a summary of SUMMARY_TOKENS when no focus is given.
+    The tokens saved are recorded per call.
+    """
+    with span("prompt_context", request=request) as current:
+        if focus is None:
+            context = summarize(source or "", budget or SUMMARY_TOKENS)
+        else:
+            context = select_context(source, focus, budget or ARTICLE_CONTEXT_TOKENS)
+        source_tokens, context_tokens = estimate_tokens(source or ""), estimate_tokens(context)
+        current.set(source_tokens=source_tokens, context_tokens=context_tokens,
+                    tokens_saved=source_tokens - context_tokens)
+    if context_tokens < source_tokens:
+        print(f"{request}: context trimmed from ~{source_tokens} to ~{context_tokens} tokens")
+    return context
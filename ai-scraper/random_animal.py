@@ -1,36 +1,14 @@
-import random
-from fetch_wiki_page import fetch_wiki_page, fetch_wiki_content
-import google.generativeai as genai
-import dotenv
+from concurrent.futures import ThreadPoolExecutor
+from fetch_wiki_page import fetch_wiki_page, fetch_wiki_article
 from animal import Animal
-import os
-dotenv.load_dotenv()
-
-API_KEY = os.getenv("GEMINI_API_KEY")
-
-def get_random_animal_name():
-    with open('ai-scraper/animals.txt') as f:
-        animals = f.read().splitlines()
-    return random.choice(animals)
-
-def generate_random_animal_article(prompt):
-    if not API_KEY:
-            raise ValueError("Please set GEMINI_API_KEY in .env file")
-    genai.configure(api_key=API_KEY)
-    print("Generating article...")
-    model = genai.GenerativeModel("gemini-2.0-flash-exp")
-    response = model.generate_content(prompt)
-    print("Article generated.")
-    return response.candidates[0].content.parts[0].text
-
-def get_random_animal():
-    animal_name = get_random_animal_name()
-    animal_wiki_name = fetch_wiki_page(animal_name)
-    animal_fact = fetch_wiki_content(animal_wiki_name)
-
-    prompt1 = f"""
-Create a comprehensive article about {animal_name} for an animal ranking website. Structure the article to help users rate the animal in these specific categories while keeping them engaged with fascinating facts:
+from catalog import get_catalog
+from prompt_context import build_context
+import gemini
 
+# Each block is generated by its own concurrent request and the results are joined in this order.
+# Adding a category block adds a parallel request, not another serial round trip.
+ARTICLE_SECTIONS = [
+    """
 Physical Capabilities
 - Detail strength relative to size
 - Compare speed and agility to similar animals
@@ -51,36 +29,9 @@ Survival Adaptations
 - Explain unique defense mechanisms
 - Describe hunting/foraging strategies
 - Detail evolutionary advantages
-
-Integrate measurable data when possible (speeds, weights, population numbers) but present them alongside engaging stories and examples. Aim to make each section both informative and entertaining.
-
-Add any additional scientifically accurate information you know about this animal that would help readers make informed ratings.
-
-Note: Focus on verifiable facts rather than subjective descriptions, allowing readers to form their own opinions for rating purposes.</userStyle>
-
-Do not include title or introduction. Start directly with the first category.
-
-Write in language that is engaging and informative, avoiding overly complex terminology or jargon. Aim for a reading level suitable for a general audience interested in animals.
-
-Do not include numbers (1. 2. etc.) or bullet points in the article.
-
-Bold the category titles (e.g., Physical Capabilities) to make the structure clear.
-
-Use new lines between categories to improve readability.
-
-Do not force good ratings or use promotional language. The goal is to provide a balanced and informative article that will help users rate the animal accurately. If animal is bad at something, mention it. If it's good at something, mention it. If it's average at something, mention it.
-
-Use european metric system for measurements (meters, kilograms, etc.).
-
-Write as much as you can!
-
-Base information: {animal_fact}
+""",
     """
-
-    prompt2 = f"""
-Create a comprehensive article about {animal_name} for an animal ranking website. Structure the article to help users rate the animal in these specific categories while keeping them engaged with fascinating facts:
-
-    Physical Structure
+Physical Structure
 - Highlight unique anatomical features
 - Describe specialized body parts
 - Explain how their shape aids survival
@@ -104,6 +55,13 @@ Overall Appeal
 - Include surprising or counterintuitive facts
 - Mention any viral or popular media appearances
 - Describe unique behaviors that make this animal special
+""",
+]
+
+ARTICLE_PROMPT = """
+Create a comprehensive article about {animal_name} for an animal ranking website. Structure the article to help users rate the animal in these specific categories while keeping them engaged with fascinating facts:
+
+{categories}
 
 Integrate measurable data when possible (speeds, weights, population numbers) but present them alongside engaging stories and examples. Aim to make each section both informative and entertaining.
 
@@ -128,11 +86,49 @@ Use european metric system for measurements (meters, kilograms, etc.).
 Write as much as you can!
 
 Base information: {animal_fact}
+"""
+
+def get_random_animal_name():
+    """Picks uniformly among the catalog's pending animals, so animals already stored are never redone."""
+    animal_name = get_catalog().pick_pending()
+    if animal_name is None:
+        raise ValueError("No pending animals left in the catalog")
+    return animal_name
+
+def generate_random_animal_article(prompt):
+    print("Generating article...")
+    article = gemini.generate_text(prompt, description="Article generation", priority=gemini.PRIORITY_ARTICLE)
+    print("Article generated.")
+    return article
+
+def build_article_prompts(animal_name, animal_fact):
+    # Each prompt only gets the parts of the extract that are relevant to its categories
+    return [
+        ARTICLE_PROMPT.format(
+            animal_name=animal_name,
+            categories=section.strip(),
+            animal_fact=build_context(animal_fact, focus=section, request="Article generation"),
+        )
+        for section in ARTICLE_SECTIONS
+    ]
+
+def get_random_animal():
+    return get_animal(get_random_animal_name())
+
+def get_animal(animal_name, wiki_page=None, revision_id=None):
+    """
+    Generates the article for `animal_name` from its Wikipedia page, fetching the page unless
+    `wiki_page` (as returned by fetch_wiki_article) is given.
     """
-    article = generate_random_animal_article(prompt1)
-    article = article + '\n\n' + generate_random_animal_article(prompt2)
+    if wiki_page is None:
+        wiki_page = fetch_wiki_article(fetch_wiki_page(animal_name), revision_id)
+
+    prompts = build_article_prompts(animal_name, wiki_page["extract"])
+    with ThreadPoolExecutor(max_workers=len(prompts)) as executor:
+        sections = list(executor.map(generate_random_animal_article, prompts))
+    article = '\n\n'.join(sections)
 
-    return Animal(animal_name, article)
+    return Animal(animal_name, article, wiki_page["title"], wiki_page["page_id"], wiki_page["revision_id"])
 
 if __name__ == "__main__":
-    print(generate_random_animal_article())
\ No newline at end of file
+    print(get_random_animal())
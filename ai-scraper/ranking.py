@@ -0,0 +1,152 @@
+"""
+Vectorized ranking engine.
+
+Ratings are reduced to one row per animal: a count vector and an animals x categories matrix of
+score sums. From those, every output is computed for all 10 categories plus the average at once:
+means, Bayesian (shrinkage-adjusted) scores, ranks and percentiles.
+
+The adjusted score pulls an animal's mean towards the mean over all ratings, weighted as if it had
+`prior_weight` extra ratings at that mean:
+
+    score = (count * mean + prior_weight * global_mean) / (count + prior_weight)
+
+so an animal with two enthusiastic ratings doesn't outrank one with hundreds of good ones.
+
+Usage:
+    python ai-scraper/ranking.py [--category NAME] [--top N] [--prior-weight W]
+"""
+import argparse
+import os
+import numpy as np
+from aggregation import RATING_CATEGORIES, SUMMARY_TABLE
+
+# The ranked columns: every rating category, then the mean of the category scores
+COLUMNS = RATING_CATEGORIES + ["average"]
+PRIOR_WEIGHT = float(os.getenv("RANKING_PRIOR_WEIGHT", 10))  # in ratings
+PAGE_SIZE = 1000
+
+class RatingMatrix:
+    """Ratings reduced to one row per animal: `counts` (animals,) and `sums` (animals, categories)."""
+
+    def __init__(self, animal_ids, counts, sums):
+        self.animal_ids = np.asarray(animal_ids)
+        self.counts = np.asarray(counts, dtype=np.int64)
+        self.sums = np.asarray(sums, dtype=np.float64).reshape(len(self.animal_ids), len(RATING_CATEGORIES))
+
+    def __len__(self):
+        return len(self.animal_ids)
+
+    @classmethod
+    def from_arrays(cls, rating_animal_ids, scores):
+        """
+        Builds the matrix from per-rating arrays: the animal id of every rating (ratings,) and
+        its scores (ratings, categories). Missing scores should be 0, as on the rankings page.
+        """
+        animal_ids, codes = np.unique(np.asarray(rating_animal_ids), return_inverse=True)
+        scores = np.asarray(scores, dtype=np.float64)
+        width = scores.shape[1]
+        counts = np.bincount(codes, minlength=len(animal_ids))
+        # One bincount over (animal, category) cells sums every category in a single pass
+        cells = (codes[:, None] * width + np.arange(width)).ravel()
+        sums = np.bincount(cells, weights=scores.ravel(), minlength=len(animal_ids) * width)
+        return cls(animal_ids, counts, sums.reshape(len(animal_ids), width))
+
+    @classmethod
+    def from_ratings(cls, ratings):
+        """Builds the matrix from rating rows as returned by the ratings table."""
+        ratings = list(ratings)
+        scores = np.array(
+            [[rating.get(category) or 0 for category in RATING_CATEGORIES] for rating in ratings], dtype=np.float64
+        ).reshape(len(ratings), len(RATING_CATEGORIES))
+        return cls.from_arrays([rating["animal_id"] for rating in ratings], scores)
+
+    @classmethod
+    def from_summaries(cls, rows):
+        """Builds the matrix from animal_rating_summary rows, without reading any ratings."""
+        rows = list(rows)
+        sums = [[row["category_sums"].get(category, 0) for category in RATING_CATEGORIES] for row in rows]
+        return cls([row["animal_id"] for row in rows], [row["rating_count"] for row in rows], sums)
+
+def rank_and_percentile(scores):
+    """
+    Per-column competition ranks (1 = best, ties share the better rank) and percentiles
+    (the share of the other animals that score strictly lower) of an (animals, columns) array.
+    """
+    count = scores.shape[0]
+    ordered = np.sort(scores, axis=0)
+    ranks = np.empty(scores.shape, dtype=np.int64)
+    percentiles = np.empty(scores.shape, dtype=np.float64)
+    for column in range(scores.shape[1]):
+        below = np.searchsorted(ordered[:, column], scores[:, column], side="left")
+        below_or_tied = np.searchsorted(ordered[:, column], scores[:, column], side="right")
+        ranks[:, column] = count - below_or_tied + 1
+        percentiles[:, column] = below / max(count - 1, 1) * 100
+    return ranks, percentiles
+
+def compute_rankings(matrix, prior_weight=PRIOR_WEIGHT):
+    """
+    Returns a dict of (animals, len(COLUMNS)) arrays: "means", "scores" (shrinkage-adjusted),
+    "ranks" and "percentiles". Ranks and percentiles are computed on the adjusted scores.
+    Animals without ratings get a mean of 0 and the global mean as their score.
+    """
+    counts = matrix.counts.astype(np.float64)[:, None]
+    means = np.divide(matrix.sums, counts, out=np.zeros_like(matrix.sums), where=counts > 0)
+
+    total = counts.sum()
+    global_means = matrix.sums.sum(axis=0) / total if total else np.zeros(len(RATING_CATEGORIES))
+    scores = (matrix.sums + prior_weight * global_means) / (counts + prior_weight)
+
+    # The shrinkage is linear, so averaging the adjusted category scores equals adjusting the average
+    means = np.column_stack([means, means.mean(axis=1)])
+    scores = np.column_stack([scores, scores.mean(axis=1)])
+    ranks, percentiles = rank_and_percentile(scores)
+    return {"means": means, "scores": scores, "ranks": ranks, "percentiles": percentiles}
+
+def to_rows(matrix, rankings):
+    """One dict per animal with its count and, per column, mean, score, rank and percentile."""
+    rows = []
+    for index, animal_id in enumerate(matrix.animal_ids.tolist()):
+        row = {"animal_id": animal_id, "rating_count": int(matrix.counts[index])}
+        for output, values in rankings.items():
+            row[output] = dict(zip(COLUMNS, values[index].tolist()))
+        rows.append(row)
+    return rows
+
+def load_summaries(client=None):
+    """Every row of animal_rating_summary, fetched a page at a time."""
+    from db_service import get_supabase
+
+    client = client or get_supabase()
+    rows = []
+    while True:
+        page = (
+            client.table(SUMMARY_TABLE)
+            .select("animal_id, rating_count, category_sums")
+            .order("animal_id")
+            .range(len(rows), len(rows) + PAGE_SIZE - 1)
+            .execute()
+            .data or []
+        )
+        rows.extend(page)
+        if len(page) < PAGE_SIZE:
+            return rows
+
+def print_leaderboard(matrix, rankings, column="average", top=20):
+    index = COLUMNS.index(column)
+    order = np.argsort(rankings["ranks"][:, index], kind="stable")[:top]
+    print(f"{'rank':>4}  {'animal':<38} {'ratings':>7} {'mean':>6} {'score':>6} {'pct':>6}")
+    for i in order:
+        print(f"{rankings['ranks'][i, index]:>4}  {str(matrix.animal_ids[i]):<38} {matrix.counts[i]:>7} "
+              f"{rankings['means'][i, index]:>6.1f} {rankings['scores'][i, index]:>6.1f} "
+              f"{rankings['percentiles'][i, index]:>6.1f}")
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Rank animals from the precomputed rating summaries.")
+    parser.add_argument("--category", choices=COLUMNS, default="average", help="column to rank by (default: %(default)s)")
+    parser.add_argument("--top", type=int, default=20, help="animals to show (default: %(default)s)")
+    parser.add_argument("--prior-weight", type=float, default=PRIOR_WEIGHT,
+                        help="ratings-worth of global mean each animal starts with (default: %(default)s)")
+    args = parser.parse_args()
+
+    matrix = RatingMatrix.from_summaries(load_summaries())
+    print_leaderboard(matrix, compute_rankings(matrix, args.prior_weight), args.category, args.top)
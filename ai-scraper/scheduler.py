@@ -0,0 +1,154 @@
+import heapq
+import itertools
+import threading
+import time
+from concurrent.futures import Future
+from contextlib import contextmanager
+from backoff import is_rate_limit, retry_after_hint
+from instrumentation import add_to_current
+
+RATE_LIMIT_PAUSE = 10  # seconds every caller waits after a quota error that carries no hint
+
+class TokenBucket:
+    """
+    Allows `per_minute` units a minute, with bursts of up to one minute's worth.
+    A per_minute of 0 means unlimited. Not thread-safe; the Scheduler holds the lock.
+    """
+
+    def __init__(self, per_minute):
+        self.per_minute = per_minute
+        self.level = float(per_minute)
+        self.updated = time.monotonic()
+
+    def _refill(self, now):
+        if self.per_minute:
+            self.level = min(self.per_minute, self.level + (now - self.updated) * self.per_minute / 60)
+        self.updated = now
+
+    def wait_time(self, amount, now):
+        """Seconds until `amount` units are available."""
+        if not self.per_minute:
+            return 0.0
+        self._refill(now)
+        # A request bigger than the whole bucket goes out once the bucket is full, instead of never
+        missing = min(amount, self.per_minute) - self.level
+        return max(0.0, missing * 60 / self.per_minute)
+
+    def take(self, amount):
+        # The level may go negative; later refills pay the debt off before anything else goes out
+        if self.per_minute:
+            self.level -= amount
+
+    def give_back(self, amount):
+        if self.per_minute:
+            self.level = min(self.per_minute, self.level + amount)
+
+class Grant:
+    """Handed to a request admitted by the scheduler; set `tokens` to what the request actually used."""
+
+    def __init__(self, estimated_tokens):
+        self.estimated_tokens = estimated_tokens
+        self.tokens = None
+
+class Scheduler:
+    """
+    Shared admission control for calls to one rate-limited API.
+    Callers block in `slot()` until the requests-per-minute and tokens-per-minute buckets allow
+    their request. Waiting callers are admitted strictly by priority (lower first), then in
+    arrival order. A quota error pauses every caller, not just the one that hit it.
+    """
+
+    def __init__(self, requests_per_minute=0, tokens_per_minute=0):
+        self.requests = TokenBucket(requests_per_minute)
+        self.tokens = TokenBucket(tokens_per_minute)
+        self._condition = threading.Condition()
+        self._waiting = []  # heap of (priority, arrival) tickets
+        self._arrivals = itertools.count()
+        self._paused_until = 0.0
+        self._in_flight = {}
+        self._in_flight_lock = threading.Lock()
+
+    def _delay(self, estimated_tokens, now):
+        return max(
+            self._paused_until - now,
+            self.requests.wait_time(1, now),
+            self.tokens.wait_time(estimated_tokens, now),
+        )
+
+    @contextmanager
+    def slot(self, estimated_tokens, priority=0):
+        """
+        Waits for this request's turn and budget, then yields a Grant.
+        The estimate is charged up front and corrected on exit if the caller set `grant.tokens`.
+        """
+        ticket = (priority, next(self._arrivals))
+        start = time.perf_counter()
+        with self._condition:
+            heapq.heappush(self._waiting, ticket)
+            try:
+                while True:
+                    # Only the first caller in line may go; the others wait for it to leave the queue
+                    delay = self._delay(estimated_tokens, time.monotonic()) if self._waiting[0] == ticket else None
+                    if delay is not None and delay <= 0:
+                        break
+                    self._condition.wait(delay)
+            finally:
+                self._waiting.remove(ticket)
+                heapq.heapify(self._waiting)
+                self._condition.notify_all()
+            self.requests.take(1)
+            self.tokens.take(estimated_tokens)
+        add_to_current("queue_wait_s", time.perf_counter() - start)
+
+        grant = Grant(estimated_tokens)
+        try:
+            yield grant
+        except Exception as e:
+            if is_rate_limit(e):
+                hint = retry_after_hint(e)
+                self.pause(hint if hint is not None else RATE_LIMIT_PAUSE)
+            raise
+        finally:
+            if grant.tokens is not None:
+                self._settle(estimated_tokens, grant.tokens)
+
+    def _settle(self, estimated, actual):
+        with self._condition:
+            if actual > estimated:
+                self.tokens.take(actual - estimated)
+            else:
+                self.tokens.give_back(estimated - actual)
+            self._condition.notify_all()
+
+    def pause(self, seconds):
+        """Holds back every request for `seconds`, e.g. after the server reported the quota exhausted."""
+        with self._condition:
+            self._paused_until = max(self._paused_until, time.monotonic() + seconds)
+            self._condition.notify_all()
+        print(f"Rate limit reached, pausing all requests for {seconds:.1f} seconds")
+
+    def coalesce(self, key, compute):
+        """
+        Runs `compute()` once for callers that ask for the same `key` at the same time: the first
+        caller computes, the others wait for and share its result (or its exception).
+        """
+        with self._in_flight_lock:
+            future = self._in_flight.get(key)
+            leader = future is None
+            if leader:
+                future = self._in_flight[key] = Future()
+        if not leader:
+            add_to_current("coalesced")
+            return future.result()
+
+        try:
+            result = compute()
+        except BaseException as e:
+            future.set_exception(e)
+            raise
+        else:
+            future.set_result(result)
+            return result
+        finally:
+            with self._in_flight_lock:
+                del self._in_flight[key]
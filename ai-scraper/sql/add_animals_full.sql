@@ -0,0 +1,34 @@
+-- Bulk variant of add_animal_full used by db_service.add_animals_bulk.
+-- p_animals is a JSON array of add_animal_full argument objects:
+--   [{"p_animal_name": ..., "p_animal_article": ..., "p_translations": [...], "p_image_urls": [...]}, ...]
+-- Every element runs in its own subtransaction, so one bad animal does not roll back the rest,
+-- and a status row is returned per element.
+-- Assumes add_animal_full(p_animal_name text, p_animal_article text, p_translations jsonb, p_image_urls text[]);
+-- adjust the casts below if it is declared differently.
+create or replace function add_animals_full(p_animals jsonb)
+returns table (name text, status text, error text)
+language plpgsql
+as $$
+declare
+    item jsonb;
+begin
+    for item in select value from jsonb_array_elements(p_animals)
+    loop
+        name := item->>'p_animal_name';
+        begin
+            perform add_animal_full(
+                p_animal_name => item->>'p_animal_name',
+                p_animal_article => item->>'p_animal_article',
+                p_translations => item->'p_translations',
+                p_image_urls => array(select jsonb_array_elements_text(item->'p_image_urls'))
+            );
+            status := 'ok';
+            error := null;
+        exception when others then
+            status := 'error';
+            error := sqlerrm;
+        end;
+        return next;
+    end loop;
+end;
+$$;
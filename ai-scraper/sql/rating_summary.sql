@@ -0,0 +1,149 @@
+-- Precomputed ratings per animal, maintained by aggregation.py, so the rankings page reads one
+-- small row per animal instead of every rating.
+-- category_sums / category_averages map each rating category (color, relative_strength, ...)
+-- to its sum / mean; average is the mean of the category means, as the rankings page shows it.
+create table if not exists animal_rating_summary (
+    animal_id uuid primary key references animals (id) on delete cascade,
+    rating_count integer not null,
+    category_sums jsonb not null,
+    category_averages jsonb not null,
+    average double precision not null,
+    last_rating_at timestamptz,
+    updated_at timestamptz not null default now()
+);
+
+alter table animal_rating_summary enable row level security;
+
+drop policy if exists "Rating summaries are readable by everyone" on animal_rating_summary;
+create policy "Rating summaries are readable by everyone"
+    on animal_rating_summary for select using (true);
+
+-- Change tracking. Ratings are edited in place (RatingForm updates the existing row), so
+-- created_at says nothing about what changed: every insert and update stamps updated_at, and
+-- every delete (or move to another animal) leaves a row in rating_deletions.
+alter table ratings add column if not exists updated_at timestamptz not null default now();
+
+create table if not exists rating_deletions (
+    id bigint generated always as identity primary key,
+    animal_id uuid not null,
+    deleted_at timestamptz not null default now()
+);
+
+-- Internal to the aggregation: RLS without policies keeps the anon and authenticated roles out
+alter table rating_deletions enable row level security;
+
+-- security definer: the rating's author may not write rating_deletions directly
+create or replace function track_rating_change()
+returns trigger
+language plpgsql
+security definer
+set search_path = public
+as $$
+begin
+    if tg_op = 'DELETE' then
+        insert into rating_deletions (animal_id) values (old.animal_id);
+        return old;
+    end if;
+    if tg_op = 'UPDATE' and old.animal_id is distinct from new.animal_id then
+        insert into rating_deletions (animal_id) values (old.animal_id);
+    end if;
+    new.updated_at := now();
+    return new;
+end;
+$$;
+
+drop trigger if exists ratings_track_change on ratings;
+create trigger ratings_track_change
+    before insert or update or delete on ratings
+    for each row execute function track_rating_change();
+
+-- aggregation.py finds changes by (updated_at, id) and (deleted_at, id) keyset pages, and then
+-- recomputes every touched animal from all of its ratings.
+drop index if exists ratings_created_at_id_idx;
+create index if not exists ratings_updated_at_id_idx on ratings (updated_at, id);
+create index if not exists ratings_animal_id_idx on ratings (animal_id);
+create index if not exists rating_deletions_deleted_at_id_idx on rating_deletions (deleted_at, id);
+
+-- Single-row watermark: the newest change (updated_at or deleted_at) folded into the summaries.
+create table if not exists rating_aggregation_state (
+    id boolean primary key default true check (id),
+    last_changed_at timestamptz,
+    updated_at timestamptz not null default now()
+);
+
+-- The first version of this file kept a created_at watermark; dropping it makes the next run a full rebuild
+alter table rating_aggregation_state add column if not exists last_changed_at timestamptz;
+alter table rating_aggregation_state drop column if exists last_created_at;
+alter table rating_aggregation_state drop column if exists last_rating_id;
+
+alter table rating_aggregation_state enable row level security;
+
+drop function if exists apply_rating_summary(jsonb, timestamptz, uuid, timestamptz, uuid, boolean);
+
+-- Writes summary rows, removes the summaries of animals left without ratings and advances the
+-- watermark in one transaction, so a failed run never leaves changes applied without the
+-- watermark moving past them (or the other way round).
+-- p_previous_changed_at is the watermark the caller started from; if another run moved it in the
+-- meantime, nothing is written. p_reset replaces the whole table (full rebuild).
+-- Deletion records that no run will read again (older than a day before the watermark) are pruned.
+create or replace function apply_rating_summary(
+    p_rows jsonb,
+    p_removed uuid[],
+    p_previous_changed_at timestamptz,
+    p_changed_at timestamptz,
+    p_reset boolean default false
+)
+returns integer
+language plpgsql
+as $$
+declare
+    state rating_aggregation_state;
+    written integer;
+begin
+    insert into rating_aggregation_state (id) values (true) on conflict (id) do nothing;
+    select * into state from rating_aggregation_state where id for update;
+
+    if not p_reset and state.last_changed_at is distinct from p_previous_changed_at then
+        raise exception 'Rating watermark moved from % to % during aggregation',
+            p_previous_changed_at, state.last_changed_at;
+    end if;
+
+    if p_reset then
+        delete from animal_rating_summary where true;
+    else
+        delete from animal_rating_summary where animal_id = any(coalesce(p_removed, '{}'));
+    end if;
+
+    insert into animal_rating_summary as s
+        (animal_id, rating_count, category_sums, category_averages, average, last_rating_at, updated_at)
+    select r.animal_id, r.rating_count, r.category_sums, r.category_averages, r.average, r.last_rating_at, now()
+    from jsonb_to_recordset(p_rows) as r(
+        animal_id uuid,
+        rating_count integer,
+        category_sums jsonb,
+        category_averages jsonb,
+        average double precision,
+        last_rating_at timestamptz
+    )
+    on conflict (animal_id) do update set
+        rating_count = excluded.rating_count,
+        category_sums = excluded.category_sums,
+        category_averages = excluded.category_averages,
+        average = excluded.average,
+        last_rating_at = excluded.last_rating_at,
+        updated_at = now();
+    get diagnostics written = row_count;
+
+    update rating_aggregation_state
+    set last_changed_at = coalesce(p_changed_at, last_changed_at), updated_at = now()
+    where id;
+
+    delete from rating_deletions where deleted_at < coalesce(p_changed_at, state.last_changed_at) - interval '1 day';
+
+    return written;
+end;
+$$;
+
+-- Only the aggregation job may write summaries or move the watermark. It runs with the service
+-- role key, which bypasses RLS, so it can still read rating_deletions and rating_aggregation_state.
+revoke execute on function apply_rating_summary(jsonb, uuid[], timestamptz, timestamptz, boolean) from public, anon, authenticated;
@@ -1,84 +1,142 @@
-import dotenv
-import os
-import google.generativeai as genai
-from copy import deepcopy
-import time
+import re
+from concurrent.futures import ThreadPoolExecutor
+from animal import Animal
+import gemini
+from prompt_context import build_context
 
-dotenv.load_dotenv()
-GEMINI_API_KEY = os.getenv("GEMINI_API_KEY")
-SLEEP_TIME = 20  # Global sleep time in seconds
+# Human-readable names make the prompt unambiguous; unknown codes are passed through as-is
+LANGUAGE_NAMES = {
+    "pl": "Polish",
+    "en": "English",
+    "de": "German",
+    "fr": "French",
+    "es": "Spanish",
+    "it": "Italian",
+}
+
+TRANSLATION_PROMPT = """
+Translate the following name of an animal and its article into {language}.
+The translation should be natural and you may need to adjust the wording or sentence structure to make it sound more fluent in {language}.
+Keep the formatting of the article, including bold category titles and new lines.
+
+Respond with a JSON object with exactly two string fields:
+"name" - the translated name of the animal, without anything else,
+"article" - the translated article, without anything else.
+
+Name: {name}
+
+Article:
+{article}
+"""
+
+NAME_PROMPT = """
+Translate the following name of an animal into {language}.
+Respond with a JSON object with exactly one string field "name" - the translated name, without anything else.
+
+Name: {name}
+
+For context:
+{article}
+"""
+
+SECTION_PROMPT = """
+Translate the following section of an article about {name} into {language}:
+{section}
+
+DO NOT WRITE ANYTHING ELSE EXCEPT THE TRANSLATION.
+Keep the bold category title and the new lines.
+The translation should be natural and you may need to adjust the wording or sentence structure to make it sound more fluent in {language}.
+"""
+
+RESUME_PROMPT = """{prompt}
+The translation was interrupted. This is the part that has already been translated:
+{partial}
+
+Continue the translation exactly where it stops. DO NOT repeat any of the text above.
+"""
+
+# random_animal asks Gemini to bold category titles, so every section starts with a **Title** line
+SECTION_HEADING = re.compile(r"^(?=[ \t]*\*\*[^*\n]+\*\*)", re.MULTILINE)
+
+def split_article(article):
+    """Splits an article into sections at its bold category headings."""
+    return [section.strip() for section in SECTION_HEADING.split(article) if section.strip()]
 
 class Translation:
     def __init__(self, animal, language):
-        self.animal = deepcopy(animal)
+        # translate() builds a new Animal, so the source animal is never modified and needs no copy
+        self.animal = animal
         self.language = language
         print(f"Initialized Translation with animal: {self.animal.name}, language: {self.language}")
 
     def __str__(self):
         return f"{self.animal.name}\n\n{self.animal.article}"
-    
+
+    def to_dict(self):
+        return {"language": self.language, "animal": self.animal.to_dict()}
+
+    @classmethod
+    def from_dict(cls, data):
+        return cls(Animal.from_dict(data["animal"]), data["language"])
+
     def __repr__(self):
-        return f"Translation({self.animal_name}, {self.article}, {self.language})"
-    
+        return f"Translation({self.animal.name}, {self.animal.article}, {self.language})"
+
     def translate(self):
-        if not GEMINI_API_KEY:
-            raise ValueError("Please set GEMINI_API_KEY in .env file")
-        
-        print("Configuring genai with API key")
-        genai.configure(api_key=GEMINI_API_KEY)
-        model = genai.GenerativeModel("gemini-2.0-flash-exp")
-        
-        prompt = f"""
-        Translate the following name of an animal and its article into {self.language}: {self.animal.name}.
-        DO NOT WRITE ANYTHING ELSE EXCEPT THE TRANSLATION.
-
-        for context:
-        {self.animal.article}
         """
-        
-        for attempt in range(3):
-            try:
-                response = model.generate_content(prompt)
-                self.animal.name = response.candidates[0].content.parts[0].text.strip()
-                print(f"Translated animal name: {self.animal.name}")
-                break
-            except Exception as e:
-                print(f"Attempt {attempt + 1} failed: {e}")
-                if attempt < 2:
-                    print(f"Retrying in {SLEEP_TIME} seconds...")
-                    time.sleep(SLEEP_TIME)
-                else:
-                    raise e
-
-        print(f"Translating article into {self.language}...")
-        prompt = f"""
-        Translate the following article about {self.animal.name} into {self.language}:
-        {self.animal.article}
-
-        DO NOT WRITE ANYTHING ELSE EXCEPT THE TRANSLATION.
-        The translation should be natural and you may need to adjust the wording or sentence structure to make it sound more fluent in {self.language}.
+        Translates the name and the article.
+        Short articles go out as a single structured request. Articles with several category
+        sections are translated section by section in parallel, each over a streaming response,
+        so a failure only retries the affected section.
         """
-        
-        for attempt in range(3):
-            try:
-                response = model.generate_content(prompt)
-                self.animal.article = response.candidates[0].content.parts[0].text
-                print(f"Translated article into {self.language}")
-                break
-            except Exception as e:
-                print(f"Attempt {attempt + 1} failed: {e}")
-                if attempt < 2:
-                    print(f"Retrying in {SLEEP_TIME} seconds...")
-                    time.sleep(SLEEP_TIME)
-                else:
-                    raise e
+        language = LANGUAGE_NAMES.get(self.language, self.language)
+        sections = split_article(self.animal.article)
+        print(f"Translating {self.animal.name} into {language} ({len(sections)} sections)...")
 
+        if len(sections) <= 1:
+            prompt = TRANSLATION_PROMPT.format(language=language, name=self.animal.name, article=self.animal.article)
+            result = gemini.generate_json(
+                prompt, required_keys=("name", "article"), description=f"Translation into {language}",
+                priority=gemini.PRIORITY_TRANSLATION,
+            )
+            name, article = result["name"], result["article"]
+        else:
+            with ThreadPoolExecutor(max_workers=len(sections) + 1) as executor:
+                name_future = executor.submit(self._translate_name, language)
+                translated = list(executor.map(lambda section: self._translate_section(section, language), sections))
+                name = name_future.result()
+            article = "\n\n".join(section.strip() for section in translated)
+
+        self.animal = Animal(name.strip(), article)
+        print(f"Translated animal name: {self.animal.name}")
+        print(f"Translated article into {language}")
         return self
-    
+
+    def _translate_name(self, language):
+        # The sections carry the article itself; the name only needs enough context to be unambiguous
+        summary = build_context(self.animal.article, request=f"Name translation into {language}")
+        prompt = NAME_PROMPT.format(language=language, name=self.animal.name, article=summary)
+        return gemini.generate_json(
+            prompt, required_keys=("name",), description=f"Name translation into {language}",
+            priority=gemini.PRIORITY_TRANSLATION,
+        )["name"]
+
+    def _translate_section(self, section, language):
+        prompt = SECTION_PROMPT.format(language=language, name=self.animal.name, section=section)
+        return gemini.stream_text(
+            prompt,
+            resume_prompt=lambda partial: RESUME_PROMPT.format(prompt=prompt, partial=partial),
+            description=f"Section translation into {language}",
+            priority=gemini.PRIORITY_TRANSLATION,
+        )
+
+def translate_all(animal, languages):
+    """Translates `animal` into every language concurrently; results keep the order of `languages`."""
+    with ThreadPoolExecutor(max_workers=max(1, len(languages))) as executor:
+        return list(executor.map(lambda language: Translation(animal, language).translate(), languages))
+
 if __name__ == "__main__":
-    from animal import Animal
     animal = Animal("Penguin", "Penguins are flightless birds that live in the Southern Hemisphere. They are known for their distinctive black and white coloration and their waddling gait. Penguins are highly adapted for life in the water, with their wings modified into flippers that allow them to swim at high speeds. They are excellent divers and can stay underwater for several minutes while hunting for fish, squid, and other marine animals. Penguins are social animals that live in large colonies, and they communicate with each other using a variety of vocalizations and body language. They are also known for their elaborate courtship rituals, which involve singing and dancing. Penguins are threatened by climate change, pollution, and overfishing, and several species are considered endangered.")
 
-    translation = Translation(animal, "French")
-    translation.translate()
-    print(translation)
+    for translation in translate_all(animal, ["fr", "pl"]):
+        print(translation)
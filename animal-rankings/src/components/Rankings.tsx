@@ -1,7 +1,7 @@
 "use client";
 
 import { useState, useEffect } from 'react';
-import { Animal, Rating, AnimalTranslation } from '@/types';
+import { Animal, Rating, AnimalTranslation, RatingSummary } from '@/types';
 import { supabase } from '@/lib/supabase';
 import { RATING_CATEGORIES } from '@/constants/ratings';
 import { Info, Loader2 } from 'lucide-react';
@@ -12,7 +12,7 @@ type RatingCategory = keyof Rating;
 type SortCategory = RatingCategory | 'average';
 
 interface AnimalWithRatings extends Animal {
-    ratings: Rating[];
+    ratingCount: number;
     averageRating: number;
     averageScores: Record<RatingCategory, number>;
 }
@@ -74,41 +74,33 @@ export function Rankings({ language }: RankingsProps) {
                     }, {});
                 }
 
-                const { data: ratingsData, error: ratingsError } = await supabase
-                    .from('ratings')
-                    .select('*');
+                // Per-animal averages are precomputed by ai-scraper/aggregation.py
+                const { data: summaryData, error: summaryError } = await supabase
+                    .from('animal_rating_summary')
+                    .select('animal_id, rating_count, category_averages, average');
 
-                if (ratingsError) throw ratingsError;
+                if (summaryError) throw summaryError;
 
-                const ratingsByAnimal: { [key: string]: Rating[] } = ratingsData?.reduce((acc: { [key: string]: Rating[] }, rating: Rating) => {
-                    if (!acc[rating.animal_id]) {
-                        acc[rating.animal_id] = [];
-                    }
-                    acc[rating.animal_id].push(rating);
+                const summaryByAnimal: { [key: string]: RatingSummary } = summaryData?.reduce((acc: { [key: string]: RatingSummary }, summary: RatingSummary) => {
+                    acc[summary.animal_id] = summary;
                     return acc;
-                }, {});
+                }, {}) || {};
 
                 type ScoreCategories = Record<string, number>;
                 const processedAnimals = animalsData.map(animal => {
-                    const animalRatings = ratingsByAnimal[animal.id] || [];
+                    const summary = summaryByAnimal[animal.id];
 
                     const categoryScores = Object.keys(RATING_CATEGORIES[language]).reduce((acc: ScoreCategories, category) => {
                         const key = category.toLowerCase();
-                        acc[key] = animalRatings.length > 0
-                            ? animalRatings.reduce((sum, rating) => sum + (Number(rating[key as keyof Rating]) || 0), 0) / animalRatings.length
-                            : 0;
+                        acc[key] = Number(summary?.category_averages[key]) || 0;
                         return acc;
                     }, {});
 
-                    const totalAverage = animalRatings.length > 0
-                        ? (Object.values(categoryScores) as number[]).reduce((sum, score) => sum + score, 0) / Object.keys(categoryScores).length
-                        : 0;
-
                     return {
                         ...animal,
                         translations: translations[animal.name] ? [translations[animal.name]] : [],
-                        ratings: animalRatings,
-                        averageRating: totalAverage,
+                        ratingCount: summary?.rating_count ?? 0,
+                        averageRating: summary?.average ?? 0,
                         averageScores: categoryScores as Record<RatingCategory, number>,
                     };
                 });
@@ -180,7 +172,7 @@ export function Rankings({ language }: RankingsProps) {
                     {rankings.map((animal, index) => {
                         const translation = animal.translations?.find(t => t.language === language);
                         const displayName = language === 'en' ? animal.name : (translation?.translated_name || animal.name);
-                        const ratingCount = animal.ratings.length;
+                        const ratingCount = animal.ratingCount;
 
                         return (
                             <div
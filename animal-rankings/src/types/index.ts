@@ -29,4 +29,12 @@ export type Rating = {
     world_attitude: number;
     overall_coolness: number;
     created_at: string;
-};
\ No newline at end of file
+    updated_at: string;
+};
+
+export type RatingSummary = {
+    animal_id: string;
+    rating_count: number;
+    category_averages: Record<string, number>;
+    average: number;
+};